@@ -0,0 +1,144 @@
+"""
+End-to-end fetch throughput against the local mock Illuminate server.
+
+Points base_url_illuminate at the mock, then runs parallel_get_assessment_scores_threaded for every score
+endpoint at each worker count and reports pages/sec, rows/sec and request latency percentiles.
+
+    python benchmarks/bench_fetch.py --workers 4,8,16,32 --assessments 200 --latency-ms 40
+    python benchmarks/bench_fetch.py --output bench.json
+    python benchmarks/bench_fetch.py --baseline bench.json  # exits 1 if rows/sec regressed beyond --tolerance
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from mock_illuminate import MockConfig, start_mock_server  # noqa: E402
+from modules import assessments_endpoints as endpoints  # noqa: E402
+from modules.rate_control import AdaptiveLimiter  # noqa: E402
+from modules.run_report import run_report, percentiles  # noqa: E402
+
+START_DATE = '2025-07-01'
+END_DATE = '2026-06-30'
+SCORE_ENDPOINTS = ['Group', 'Standard', 'No_Standard']
+
+
+def run_once(assessment_id_list, endpoint_list, workers, limiter_args):
+    # Fresh limiter and report per run so neither carries state between worker counts
+    endpoints.configure_rate_limiter(AdaptiveLimiter(**limiter_args))
+    run_report.reset()
+
+    rows = 0
+    start = time.perf_counter()
+    for endpoint in endpoint_list:
+        df, _ = endpoints.parallel_get_assessment_scores_threaded(
+            'benchmark-token', assessment_id_list, endpoint, START_DATE, END_DATE, max_workers=workers
+        )
+        rows += len(df)
+    elapsed = time.perf_counter() - start
+
+    requests = run_report.request_frame()
+    pages = int((requests['status_code'] == 200).sum())
+    return {
+        'elapsed_s': round(elapsed, 3),
+        'pages': pages,
+        'rows': rows,
+        'pages_per_s': round(pages / elapsed, 1),
+        'rows_per_s': round(rows / elapsed, 1),
+        'retries': int(requests['retries'].sum()),
+        'latency_s': percentiles(requests['latency_s']),
+        'final_limit': int(endpoints.rate_limiter.limit),
+    }
+
+
+def run_benchmark(args):
+    config = MockConfig(args.assessments, args.min_rows, args.max_rows, args.page_size, args.latency_ms, args.jitter_ms,
+                        args.error_rate, args.error_status, fixtures_dir=args.fixtures_dir, seed=args.seed,
+                        empty_rate=args.empty_rate, ms_per_1000_rows=args.ms_per_1000_rows)
+    server, mock, base_url = start_mock_server(config)
+    endpoints.base_url_illuminate = base_url
+    endpoints.configure_response_cache(None)
+    limiter_args = {'initial_limit': args.rate_initial, 'max_limit': args.rate_max, 'backoff_base': args.backoff_base}
+
+    try:
+        endpoints.configure_rate_limiter(AdaptiveLimiter(**limiter_args))
+        _, assessment_id_list = endpoints.get_all_assessments_metadata('benchmark-token')
+        assessment_id_list = [str(_id) for _id in assessment_id_list]
+        endpoint_list = args.endpoints.split(',')
+
+        results = []
+        for workers in [int(w) for w in args.workers.split(',')]:
+            runs = [run_once(assessment_id_list, endpoint_list, workers, limiter_args) for _ in range(args.repeat)]
+            median = sorted(runs, key=lambda run: run['rows_per_s'])[len(runs) // 2]
+            median['workers'] = workers
+            median['rows_per_s_runs'] = [run['rows_per_s'] for run in runs]
+            results.append(median)
+            print(f"workers={workers:>3}  {median['pages_per_s']:>8} pages/s  {median['rows_per_s']:>10} rows/s  "
+                  f"p50={median['latency_s'].get('p50')}s p95={median['latency_s'].get('p95')}s  "
+                  f"retries={median['retries']}  limit={median['final_limit']}")
+    finally:
+        server.shutdown()
+
+    return {
+        'config': {k: v for k, v in vars(args).items() if k not in ('output', 'baseline', 'tolerance')},
+        'assessments': len(assessment_id_list),
+        'server': mock.stats(),
+        'results': results,
+    }
+
+
+def compare_to_baseline(report, baseline_path, tolerance):
+    # Returns the worker counts whose median rows/sec fell more than tolerance below the baseline
+    with open(baseline_path) as f:
+        baseline = {run['workers']: run for run in json.load(f)['results']}
+    regressions = []
+    for run in report['results']:
+        previous = baseline.get(run['workers'])
+        if previous and run['rows_per_s'] < previous['rows_per_s'] * (1 - tolerance):
+            regressions.append(run['workers'])
+            print(f"REGRESSION workers={run['workers']}: {run['rows_per_s']} rows/s vs baseline {previous['rows_per_s']}")
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Fetch path throughput benchmark against a mock Illuminate server')
+    parser.add_argument('--workers', default='4,8,16,32')
+    parser.add_argument('--endpoints', default=','.join(SCORE_ENDPOINTS))
+    parser.add_argument('--repeat', type=int, default=3)
+    parser.add_argument('--assessments', type=int, default=100)
+    parser.add_argument('--min-rows', type=int, default=50)
+    parser.add_argument('--max-rows', type=int, default=3000)
+    parser.add_argument('--empty-rate', type=float, default=0.4, help='Share of (assessment, endpoint) pairs with no rows')
+    parser.add_argument('--page-size', type=int, default=None)
+    parser.add_argument('--latency-ms', type=float, default=30.0)
+    parser.add_argument('--jitter-ms', type=float, default=10.0)
+    parser.add_argument('--ms-per-1000-rows', type=float, default=300.0, help='Extra latency per 1000 rows, so empty pages come back fastest')
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--fixtures-dir', default=None)
+    parser.add_argument('--seed', type=int, default=7)
+    parser.add_argument('--rate-initial', type=int, default=16)
+    parser.add_argument('--rate-max', type=int, default=256)
+    parser.add_argument('--backoff-base', type=float, default=0.05, help='Backoff base in seconds, kept small so injected errors do not dominate')
+    parser.add_argument('--output', default=None, help='Write the results as JSON')
+    parser.add_argument('--baseline', default=None, help='JSON from a previous --output run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.15)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(message)s')
+    report = run_benchmark(args)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Wrote {args.output}')
+    if args.baseline and compare_to_baseline(report, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
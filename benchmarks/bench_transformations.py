@@ -0,0 +1,180 @@
+"""
+Per-step timings and peak memory for bring_together_test_results and create_test_results_view on synthetic frames.
+
+The grade lookup reads a seeded roster fixture through the local roster cache instead of BigQuery, and the
+overrides come from config/assessment_overrides.json only (APPLY_MANUAL_CHANGES stays off).
+
+    python benchmarks/bench_transformations.py --rows 100000,1000000,10000000
+    python benchmarks/bench_transformations.py --rows 1000000 --output view.json
+    python benchmarks/bench_transformations.py --rows 1000000 --baseline view.json  # exits 1 on a slower step
+"""
+import argparse
+import json
+import logging
+import os
+import sys
+import tempfile
+import time
+import tracemalloc
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+#The roster cache directory is read at import, so the fixture location is set before the modules load
+FIXTURE_DIR = tempfile.mkdtemp(prefix='illuminate_bench_roster_')
+os.environ['ROSTER_CACHE_DIR'] = FIXTURE_DIR
+os.environ['APPLY_MANUAL_CHANGES'] = '0'
+
+import pandas as pd  # noqa: E402
+from synthetic_results import generate_results, generate_roster  # noqa: E402
+from modules.frame_transformations import (  # noqa: E402
+    add_in_grade_levels, add_in_curriculum_col, add_in_unit_col, create_test_type_column, add_in_exit_ticket_info,
+    bring_together_test_results, create_test_results_view,
+)
+from modules.overrides import load_override_rules, apply_overrides  # noqa: E402
+from modules.dtypes import apply_dtype_policy, as_object  # noqa: E402
+from modules.fingerprint import drop_duplicate_rows  # noqa: E402
+from modules.roster_cache import roster_cache_path  # noqa: E402
+from modules.run_report import RssSampler, current_rss  # noqa: E402
+
+YEARS_DATA = '25-26'
+VIEW_COLUMNS = ['data_source', 'assessment_id', 'date_taken', 'grade_levels', 'local_student_id', 'test_type', 'curriculum', 'unit',
+                'unit_labels', 'title', 'standard_code', 'percent_correct', 'performance_band_level', 'performance_band_label',
+                'proficiency', 'mastered', '__count']
+
+
+def write_roster_fixture(rows, seed):
+    path = roster_cache_path(YEARS_DATA, FIXTURE_DIR)
+    generate_roster(rows, seed).to_parquet(path, index=False)
+    return path
+
+
+def select_columns(test_results):
+    # The proficiency, column selection and rename block of create_test_results_view
+    test_results.loc[:, 'proficiency'] = as_object(test_results['performance_band_level']) + ' ' + as_object(test_results['performance_band_label'])
+    test_results['data_source'] = 'illuminate'
+    test_results = test_results[VIEW_COLUMNS].rename(columns={'grade_levels': 'grade', 'percent_correct': 'score'})
+    test_results.loc[test_results['grade'] == 'K', 'grade'] = 0
+    return test_results
+
+
+def combine_steps():
+    def concat(frames):
+        no_standard, standard = frames
+        df = pd.concat([standard, no_standard])
+        df['standard_code'] = as_object(df['standard_code']).fillna('percent')
+        return df
+    return [
+        ('concat', concat),
+        ('dedupe', lambda df: drop_duplicate_rows(df)),
+        ('dtype_policy', lambda df: apply_dtype_policy(df, name='assessment_results_combined')),
+    ]
+
+
+def view_steps():
+    rules = load_override_rules()
+    return [
+        ('grade_merge', lambda df: add_in_grade_levels(df, YEARS_DATA)),
+        ('curriculum', add_in_curriculum_col),
+        ('unit', add_in_unit_col),
+        ('test_type', create_test_type_column),
+        ('overrides', lambda df: apply_overrides(df, rules)),
+        ('exit_ticket', add_in_exit_ticket_info),
+        ('column_selection', select_columns),
+        ('dedupe', lambda df: drop_duplicate_rows(df)),
+        ('dtype_policy', lambda df: apply_dtype_policy(df, name='illuminate_assessment_results')),
+    ]
+
+
+def measure(func, value, trace_allocations):
+    """
+    Runs func(value) and returns (result, seconds, peak RSS growth in MB, peak traced MB or None).
+    """
+    if trace_allocations:
+        tracemalloc.start()
+    rss_before = current_rss()
+    start = time.perf_counter()
+    with RssSampler(interval=0.05) as sampler:
+        result = func(value)
+    seconds = time.perf_counter() - start
+    traced = None
+    if trace_allocations:
+        traced = round(tracemalloc.get_traced_memory()[1] / 1024 ** 2, 1)
+        tracemalloc.stop()
+    return result, round(seconds, 4), round((sampler.peak - rss_before) / 1024 ** 2, 1), traced
+
+
+def run_steps(name, steps, value, trace_allocations):
+    timings = []
+    for step, func in steps:
+        value, seconds, rss_mb, traced_mb = measure(func, value, trace_allocations)
+        timings.append({'stage': name, 'step': step, 'seconds': seconds, 'peak_rss_growth_mb': rss_mb, 'peak_traced_mb': traced_mb})
+    return value, timings
+
+
+def run_size(rows, seed, trace_allocations):
+    write_roster_fixture(rows, seed)
+    no_standard, standard = generate_results(rows, seed)
+    logging.info(f'Generated {len(no_standard) + len(standard)} rows for {rows}')
+
+    combined, timings = run_steps('bring_together', combine_steps(), (no_standard.copy(), standard.copy()), trace_allocations)
+    view, view_timings = run_steps('create_view', view_steps(), combined.copy(), trace_allocations)
+    timings += view_timings
+
+    # End to end through the real functions, so the step list cannot drift from them unnoticed
+    combined_e2e, seconds, rss_mb, traced_mb = measure(lambda frames: bring_together_test_results(*frames), (no_standard, standard), trace_allocations)
+    timings.append({'stage': 'bring_together', 'step': 'total', 'seconds': seconds, 'peak_rss_growth_mb': rss_mb, 'peak_traced_mb': traced_mb})
+    view_e2e, seconds, rss_mb, traced_mb = measure(lambda df: create_test_results_view(df, YEARS_DATA), combined_e2e, trace_allocations)
+    timings.append({'stage': 'create_view', 'step': 'total', 'seconds': seconds, 'peak_rss_growth_mb': rss_mb, 'peak_traced_mb': traced_mb})
+
+    return {'rows': rows, 'combined_rows': len(combined_e2e), 'view_rows': len(view_e2e), 'steps': timings}
+
+
+def print_size(result):
+    print(f"\n{result['rows']:,} rows -> {result['combined_rows']:,} combined, {result['view_rows']:,} in the view")
+    for timing in result['steps']:
+        traced = f"  traced {timing['peak_traced_mb']} MB" if timing['peak_traced_mb'] is not None else ''
+        print(f"  {timing['stage']:<15}{timing['step']:<18}{timing['seconds']:>10.3f}s  +{timing['peak_rss_growth_mb']} MB RSS{traced}")
+
+
+def compare_to_baseline(report, baseline_path, tolerance):
+    # Returns (rows, stage, step) for steps that got slower by more than tolerance, ignoring sub-10ms steps
+    with open(baseline_path) as f:
+        baseline = {(size['rows'], t['stage'], t['step']): t['seconds'] for size in json.load(f)['results'] for t in size['steps']}
+    regressions = []
+    for size in report['results']:
+        for timing in size['steps']:
+            key = (size['rows'], timing['stage'], timing['step'])
+            previous = baseline.get(key)
+            if previous and previous > 0.01 and timing['seconds'] > previous * (1 + tolerance):
+                regressions.append(key)
+                print(f'REGRESSION {key}: {timing["seconds"]}s vs baseline {previous}s')
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Microbenchmarks for bring_together_test_results and create_test_results_view')
+    parser.add_argument('--rows', default='100000,1000000,10000000')
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--tracemalloc', action='store_true', help='Also record peak traced allocations (slower)')
+    parser.add_argument('--output', default=None, help='Write the results as JSON')
+    parser.add_argument('--baseline', default=None, help='JSON from a previous --output run to compare against')
+    parser.add_argument('--tolerance', type=float, default=0.2)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.WARNING, format='%(asctime)s - %(message)s')
+    report = {'config': {'seed': args.seed, 'tracemalloc': args.tracemalloc}, 'results': []}
+    for rows in [int(r) for r in args.rows.split(',')]:
+        result = run_size(rows, args.seed, args.tracemalloc)
+        print_size(result)
+        report['results'].append(result)
+
+    if args.output:
+        with open(args.output, 'w') as f:
+            json.dump(report, f, indent=2)
+        print(f'Wrote {args.output}')
+    if args.baseline and compare_to_baseline(report, args.baseline, args.tolerance):
+        sys.exit(1)
+
+
+if __name__ == '__main__':
+    main()
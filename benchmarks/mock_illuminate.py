@@ -0,0 +1,283 @@
+"""
+Local stand-in for the Illuminate REST API, for benchmarking the fetch path without touching production.
+
+Serves Assessments and the three AssessmentAggregateStudentResponses* endpoints in the same
+{'results', 'num_results', 'num_pages'} envelope, from synthetic rows or from recorded fixtures,
+with configurable latency, page size, error rate and share of empty results.
+
+Recorded fixtures are JSON lists of row dicts laid out as:
+    {fixtures_dir}/Assessments.json
+    {fixtures_dir}/{endpoint path}/{assessment_id}.json
+
+Run standalone with:
+    python benchmarks/mock_illuminate.py --port 8765 --assessments 200 --latency-ms 50
+"""
+import argparse
+import gzip
+import json
+import logging
+import os
+import random
+import threading
+import time
+from functools import lru_cache
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import urlparse, parse_qs
+
+API_PREFIX = '/live/rest_server.php/Api/'
+SCORE_PATHS = {
+    'AssessmentAggregateStudentResponses': 'No_Standard',
+    'AssessmentAggregateStudentResponsesStandard': 'Standard',
+    'AssessmentAggregateStudentResponsesGroup': 'Group',
+}
+SUBJECTS = ['Math', 'ELA', 'Science', 'History']
+BANDS = [('1', 'Far Below Basic'), ('2', 'Below Basic'), ('3', 'Basic'), ('4', 'Proficient'), ('5', 'Advanced')]
+TEST_TYPES = ['Checkpoint', 'Exit Ticket', 'Interim', 'Unit Assessment']
+
+
+class MockConfig:
+    """
+    Settings for the mock server.
+
+    Args:
+        assessments (int): Number of synthetic assessments.
+        min_rows / max_rows (int): Rows per (assessment, endpoint), drawn per assessment.
+        empty_rate (float): Fraction of (assessment, endpoint) pairs with no rows in the date window, as the
+            Standard and Group endpoints return for most assessments.
+        page_size (int): Rows per page. None honours the limit query argument, as Illuminate does.
+        latency_ms (float): Mean added latency per request.
+        jitter_ms (float): Uniform +/- jitter around latency_ms.
+        ms_per_1000_rows (float): Extra latency per 1000 rows served, so full pages are slower than empty ones.
+        error_rate (float): Fraction of requests answered with error_status instead of data.
+        error_status (int): Status used for injected errors, 429 and 5xx are retried by the client.
+        gzip (bool): Gzip responses when the client accepts it.
+        fixtures_dir (str): Serve recorded fixtures instead of synthetic rows.
+        seed (int): Seed for the synthetic data and the injected errors.
+    """
+
+    def __init__(self, assessments=100, min_rows=50, max_rows=3000, page_size=None, latency_ms=0.0, jitter_ms=0.0,
+                 error_rate=0.0, error_status=503, gzip=True, fixtures_dir=None, seed=7, empty_rate=0.0, ms_per_1000_rows=0.0):
+        self.assessments = assessments
+        self.min_rows = min_rows
+        self.max_rows = max_rows
+        self.empty_rate = empty_rate
+        self.page_size = page_size
+        self.latency_ms = latency_ms
+        self.jitter_ms = jitter_ms
+        self.ms_per_1000_rows = ms_per_1000_rows
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.gzip = gzip
+        self.fixtures_dir = fixtures_dir
+        self.seed = seed
+
+
+def assessment_ids(config):
+    return [str(100000 + i) for i in range(config.assessments)]
+
+
+def assessment_title(assessment_id):
+    rng = random.Random(int(assessment_id))
+    grade = rng.randint(6, 12)
+    subject = rng.choice(SUBJECTS)
+    unit = rng.randint(1, 8)
+    return f'{grade}th Grade {subject} Unit {unit} {rng.choice(TEST_TYPES)} 25-26'
+
+
+def synthetic_row_count(config, assessment_id, endpoint):
+    rng = random.Random(f'{config.seed}-{assessment_id}-{endpoint}')
+    if rng.random() < config.empty_rate:
+        return 0
+    return rng.randint(config.min_rows, config.max_rows)
+
+
+def synthetic_rows(config, assessment_id, endpoint, start, stop):
+    # Rows start..stop of one (assessment, endpoint), generated deterministically so every page is stable
+    title = assessment_title(assessment_id)
+    rows = []
+    for i in range(start, stop):
+        rng = random.Random(f'{config.seed}-{assessment_id}-{endpoint}-{i}')
+        level, label = rng.choice(BANDS)
+        row = {
+            'assessment_id': int(assessment_id),
+            'title': title,
+            'local_student_id': str(500000 + (i * 7919 + int(assessment_id)) % 60000),
+            'date_taken': f'2025-{rng.randint(8, 12):02d}-{rng.randint(1, 28):02d}',
+            'percent_correct': round(rng.uniform(0, 100), 2),
+            'performance_band_level': level,
+            'performance_band_label': label,
+            'mastered': rng.random() > 0.5,
+            '__count': 1,
+        }
+        if endpoint == 'No_Standard':
+            row.update({'version': rng.randint(1, 3), 'version_label': f'Form {rng.choice("ABC")}'})
+        elif endpoint == 'Standard':
+            code = f'{rng.randint(3, 8)}.NF.{rng.randint(1, 7)}'
+            row.update({'academic_benchmark_guid': f'guid-{code}', 'standard_code': code, 'standard_description': f'Standard {code}'})
+        else:
+            group = rng.randint(1, 4)
+            row.update({'group_id': group, 'group_name': f'Group {group}', 'reporting_group': f'Reporting {group}'})
+        rows.append(row)
+    return rows
+
+
+class MockIlluminate:
+    """
+    Serves pages for one MockConfig and counts what it served.
+    """
+
+    def __init__(self, config):
+        self.config = config
+        self.requests = 0
+        self.errors = 0
+        self.rows_served = 0
+        self._lock = threading.Lock()
+        self._rng = random.Random(config.seed)
+        self.page_body = lru_cache(maxsize=4096)(self._page_body)
+
+    def _fixture(self, *parts):
+        path = os.path.join(self.config.fixtures_dir, *parts)
+        if not os.path.exists(path):
+            return []
+        with open(path) as f:
+            return json.load(f)
+
+    def dataset(self, path, assessment_id):
+        # Returns (total rows, fetch(start, stop)) for one endpoint / assessment
+        if self.config.fixtures_dir:
+            rows = self._fixture('Assessments.json') if path == 'Assessments' else self._fixture(path, f'{assessment_id}.json')
+            return len(rows), lambda start, stop: rows[start:stop]
+        if path == 'Assessments':
+            ids = assessment_ids(self.config)
+            return len(ids), lambda start, stop: [{'assessment_id': int(_id), 'title': assessment_title(_id)} for _id in ids[start:stop]]
+        if assessment_id is None or assessment_id not in set(assessment_ids(self.config)):
+            return 0, lambda start, stop: []
+        endpoint = SCORE_PATHS[path]
+        total = synthetic_row_count(self.config, assessment_id, endpoint)
+        return total, lambda start, stop: synthetic_rows(self.config, assessment_id, endpoint, start, stop)
+
+    def _page_body(self, path, assessment_id, page, limit):
+        total, fetch = self.dataset(path, assessment_id)
+        page_size = self.config.page_size or limit
+        num_pages = max(1, -(-total // page_size))
+        start = (page - 1) * page_size
+        rows = fetch(start, min(start + page_size, total)) if start < total else []
+        body = json.dumps({'results': rows, 'num_results': total, 'num_pages': num_pages}).encode('utf-8')
+        return body, len(rows)
+
+    def should_fail(self):
+        with self._lock:
+            self.requests += 1
+            if self.config.error_rate and self._rng.random() < self.config.error_rate:
+                self.errors += 1
+                return True
+        return False
+
+    def delay(self, rows=0):
+        latency = self.config.latency_ms + random.uniform(-self.config.jitter_ms, self.config.jitter_ms)
+        latency += self.config.ms_per_1000_rows * rows / 1000
+        if latency > 0:
+            time.sleep(latency / 1000)
+
+    def stats(self):
+        return {'requests': self.requests, 'errors': self.errors, 'rows_served': self.rows_served}
+
+
+def make_handler(mock):
+
+    class Handler(BaseHTTPRequestHandler):
+        protocol_version = 'HTTP/1.1'  # keep-alive, like the real API behind its load balancer
+
+        def log_message(self, format, *args):
+            logging.debug(format % args)
+
+        def send_body(self, status, body, headers=None):
+            if mock.config.gzip and 'gzip' in self.headers.get('Accept-Encoding', ''):
+                body = gzip.compress(body, compresslevel=1)
+                headers = {**(headers or {}), 'Content-Encoding': 'gzip'}
+            self.send_response(status)
+            self.send_header('Content-Type', 'application/json')
+            self.send_header('Content-Length', str(len(body)))
+            for key, value in (headers or {}).items():
+                self.send_header(key, value)
+            self.end_headers()
+            self.wfile.write(body)
+
+        def do_GET(self):
+            url = urlparse(self.path)
+            if not url.path.startswith(API_PREFIX):
+                self.send_body(404, b'{"error": "not found"}')
+                return
+            path = url.path[len(API_PREFIX):].strip('/')
+            if path != 'Assessments' and path not in SCORE_PATHS:
+                self.send_body(404, b'{"error": "unknown endpoint"}')
+                return
+
+            query = parse_qs(url.query)
+            page = int(query.get('page', ['1'])[0])
+            limit = int(query.get('limit', ['1000'])[0])
+            assessment_id = query.get('assessment_id', [None])[0]
+            body, rows = mock.page_body(path, assessment_id, page, limit)
+
+            mock.delay(rows)
+            if mock.should_fail():
+                self.send_body(mock.config.error_status, b'{"error": "injected"}', {'Retry-After': '0'})
+                return
+
+            with mock._lock:
+                mock.rows_served += rows
+            self.send_body(200, body)
+
+    return Handler
+
+
+def start_mock_server(config, host='127.0.0.1', port=0):
+    """
+    Starts the mock server on a daemon thread.
+
+    Returns:
+        tuple: (server, mock, base_url) where base_url is what base_url_illuminate should be set to.
+            Call server.shutdown() when done.
+    """
+    mock = MockIlluminate(config)
+    server = ThreadingHTTPServer((host, port), make_handler(mock))
+    server.daemon_threads = True
+    thread = threading.Thread(target=server.serve_forever, name='mock-illuminate', daemon=True)
+    thread.start()
+    base_url = f'http://{host}:{server.server_address[1]}{API_PREFIX}'
+    logging.info(f'Mock Illuminate serving {config.assessments} assessments at {base_url}')
+    return server, mock, base_url
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Local mock of the Illuminate REST API')
+    parser.add_argument('--host', default='127.0.0.1')
+    parser.add_argument('--port', type=int, default=8765)
+    parser.add_argument('--assessments', type=int, default=100)
+    parser.add_argument('--min-rows', type=int, default=50)
+    parser.add_argument('--max-rows', type=int, default=3000)
+    parser.add_argument('--empty-rate', type=float, default=0.0)
+    parser.add_argument('--page-size', type=int, default=None)
+    parser.add_argument('--latency-ms', type=float, default=0.0)
+    parser.add_argument('--jitter-ms', type=float, default=0.0)
+    parser.add_argument('--ms-per-1000-rows', type=float, default=0.0)
+    parser.add_argument('--error-rate', type=float, default=0.0)
+    parser.add_argument('--error-status', type=int, default=503)
+    parser.add_argument('--fixtures-dir', default=None)
+    parser.add_argument('--seed', type=int, default=7)
+    args = parser.parse_args()
+
+    logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(message)s')
+    config = MockConfig(args.assessments, args.min_rows, args.max_rows, args.page_size, args.latency_ms, args.jitter_ms,
+                        args.error_rate, args.error_status, fixtures_dir=args.fixtures_dir, seed=args.seed,
+                        empty_rate=args.empty_rate, ms_per_1000_rows=args.ms_per_1000_rows)
+    server, _, base_url = start_mock_server(config, args.host, args.port)
+    print(f'Serving on {base_url}, Ctrl+C to stop')
+    try:
+        threading.Event().wait()
+    except KeyboardInterrupt:
+        server.shutdown()
+
+
+if __name__ == '__main__':
+    main()
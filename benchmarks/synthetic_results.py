@@ -0,0 +1,169 @@
+"""
+Synthetic assessment result frames shaped like the output of the fetch phase, for benchmarking frame_transformations.
+
+Titles follow the patterns the curriculum, unit, exit ticket and checkpoint rules look for. Standard codes,
+performance bands and student ids follow the API's formats, and about 1% of rows are exact duplicates
+so deduplication has work to do. Generation is vectorised and categorical, so 10M rows stays practical.
+
+    python benchmarks/synthetic_results.py --rows 1000000 --out /tmp/synthetic  # writes Parquet for reuse
+"""
+import argparse
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.dtypes import apply_dtype_policy, STRING_DTYPE  # noqa: E402
+
+TITLE_TEMPLATES = [
+    'Grade {g} Math {g}.{domain}.A.{k}.b Checkpoint',
+    'IM Grade {g} Unit {u} End-of-Unit Assessment',
+    '{g}th Grade Science Interim Assessment #{n}',
+    '{g}th Grade Math Unit {u} Assessment 25-26',
+    'Algebra I Unit {u} Assessment 25-26',
+    'Algebra II Interim_PT_{n}',
+    'Geometry Interim {n}',
+    'PreCal Unit {u} Test',
+    'Biology Final',
+    'Chemistry Unit {u} Assessment',
+    'APUSH Unit {u} Test',
+    'MWH Interim Assessment {n}',
+    'Gov Unit {u} Assessment',
+    'Into Reading Grade {g} Module {u} Assessment',
+    'ELA_G{g}_Module {u}_Lesson {k}_Exit Ticket_MC',
+    'ELA_G{g}_Module {u}_Lesson {k}_Exit Ticket_CR',
+    'English 10 IA {n}',
+    'PLTW Algebra Advantage Checkpoint Lesson {k}',
+    'The Outsiders - Mid-Unit Novel Test',
+    'Grade {g} Social Studies Unit {u} Assessment',
+    'Spanish I Unit {u} Quiz',
+    'Stats Final',
+]
+DOMAINS = ['RP', 'NS', 'EE', 'G', 'SP', 'NF', 'OA']
+BANDS = [('1', 'Far Below Basic'), ('2', 'Below Basic'), ('3', 'Basic'), ('4', 'Proficient'), ('5', 'Advanced')]
+GRADES = ['K'] + [str(g) for g in range(1, 13)]
+
+
+def assessment_catalog(count, rng):
+    # One title per assessment, drawn from the templates with realistic grades / units / numbers
+    titles = []
+    for i in range(count):
+        template = TITLE_TEMPLATES[i % len(TITLE_TEMPLATES)]
+        titles.append(template.format(g=int(rng.integers(3, 13)), domain=DOMAINS[int(rng.integers(len(DOMAINS)))],
+                                      k=int(rng.integers(1, 9)), u=int(rng.integers(1, 9)), n=int(rng.integers(1, 4))))
+    ids = [str(140000 + i) for i in range(count)]
+    return ids, titles
+
+
+def standard_catalog(count, rng):
+    codes = []
+    for i in range(count):
+        g = int(rng.integers(3, 9))
+        kind = i % 4
+        if kind == 0:
+            codes.append(f'{g}.NF.{int(rng.integers(1, 8))}')
+        elif kind == 1:
+            codes.append(f'{g}.RP.A.{int(rng.integers(1, 4))}')
+        elif kind == 2:
+            codes.append(f'RL.{g}.{int(rng.integers(1, 10))}')
+        else:
+            codes.append(f'HSA-REI.B.{int(rng.integers(1, 5))}')
+    return codes
+
+
+def categorical(codes, values):
+    # Catalog values repeat (fixed titles, codes drawn twice), so categories are the distinct values
+    categories, inverse = np.unique(np.asarray(values, dtype=object), return_inverse=True)
+    return pd.Categorical.from_codes(inverse[codes], categories=categories)
+
+
+def student_pool(rows):
+    return max(1000, min(60000, rows // 40))
+
+
+def student_ids(rows, rng):
+    return (500000 + rng.integers(0, student_pool(rows), size=rows)).astype(str)
+
+
+def base_frame(rows, ids, titles, rng):
+    assessment = rng.integers(0, len(ids), size=rows)
+    band = rng.integers(0, len(BANDS), size=rows)
+    days = rng.integers(0, 300, size=rows)
+    return {
+        'assessment_id': pd.Categorical.from_codes(assessment, categories=ids),
+        'title': categorical(assessment, titles),
+        'local_student_id': pd.array(student_ids(rows, rng), dtype=STRING_DTYPE),
+        'date_taken': pd.Timestamp('2025-08-01') + pd.to_timedelta(days, unit='D'),
+        'percent_correct': rng.integers(0, 101, size=rows),
+        'performance_band_level': pd.Categorical.from_codes(band, categories=[b[0] for b in BANDS]),
+        'performance_band_label': pd.Categorical.from_codes(band, categories=[b[1] for b in BANDS]),
+        'mastered': rng.random(rows) > 0.5,
+        '__count': np.ones(rows, dtype='int64'),
+    }
+
+
+def with_duplicates(frame, rng, fraction=0.01):
+    duplicates = frame.iloc[rng.integers(0, len(frame), size=int(len(frame) * fraction))]
+    return pd.concat([frame, duplicates], ignore_index=True)
+
+
+def generate_results(rows, seed=0, standard_share=0.6):
+    """
+    Builds (test_results_no_standard, test_results_standard) with rows rows in total, in the dtypes
+    combine_results hands to bring_together_test_results.
+    """
+    rng = np.random.default_rng(seed)
+    ids, titles = assessment_catalog(max(50, min(5000, rows // 200)), rng)
+    codes = standard_catalog(200, rng)
+
+    standard_rows = int(rows * standard_share)
+    standard = base_frame(standard_rows, ids, titles, rng)
+    code = rng.integers(0, len(codes), size=standard_rows)
+    standard['academic_benchmark_guid'] = categorical(code, [f'guid-{c}' for c in codes])
+    standard['standard_code'] = categorical(code, codes)
+    standard['standard_description'] = categorical(code, [f'Description of {c}' for c in codes])
+    standard['standard_no_standard'] = 'Standard'
+
+    no_standard_rows = rows - standard_rows
+    no_standard = base_frame(no_standard_rows, ids, titles, rng)
+    version = rng.integers(1, 4, size=no_standard_rows)
+    no_standard['version'] = version
+    no_standard['version_label'] = pd.Categorical.from_codes(version - 1, categories=['Form A', 'Form B', 'Form C'])
+    no_standard['standard_no_standard'] = 'No_Standard'
+
+    frames = []
+    for name, data in [('No_Standard', no_standard), ('Standard', standard)]:
+        frame = with_duplicates(pd.DataFrame(data), rng)
+        frames.append(apply_dtype_policy(frame, name=f'synthetic {name}'))
+    return tuple(frames)
+
+
+def generate_roster(rows, seed=0):
+    # One grade per student in the pool generate_results draws from, in the roster cache's shape
+    rng = np.random.default_rng(seed + 1)
+    pool = student_pool(rows)
+    return pd.DataFrame({
+        'local_student_id': np.arange(500000, 500000 + pool, dtype='int64'),
+        'grade_levels': pd.Categorical(rng.choice(GRADES, size=pool), categories=GRADES),
+    })
+
+
+def main():
+    parser = argparse.ArgumentParser(description='Write synthetic assessment result frames as Parquet')
+    parser.add_argument('--rows', type=int, default=100000)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--out', required=True)
+    args = parser.parse_args()
+
+    os.makedirs(args.out, exist_ok=True)
+    no_standard, standard = generate_results(args.rows, args.seed)
+    no_standard.to_parquet(os.path.join(args.out, f'no_standard_{args.rows}.parquet'), index=False)
+    standard.to_parquet(os.path.join(args.out, f'standard_{args.rows}.parquet'), index=False)
+    generate_roster(args.rows, args.seed).to_parquet(os.path.join(args.out, f'roster_{args.rows}.parquet'), index=False)
+    print(f'Wrote {len(no_standard) + len(standard)} rows to {args.out}')
+
+
+if __name__ == '__main__':
+    main()
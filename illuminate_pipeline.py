@@ -5,7 +5,11 @@ import sys
 from modules.auth import *
 from modules.assessments_endpoints import *
 from modules.frame_transformations import *
-from gcp_utils_sds import buckets, yoy, append_assessment_titles
+from modules.gcs_sink import write_frame_to_gcs, frame_file_name, OUTPUT_FORMAT
+from modules.upload_stage import upload_artifacts
+from modules.fetch_spool import fetch_spool_from_env
+from modules.run_report import run_report, stage
+from gcp_utils_sds import yoy, append_assessment_titles
 import multiprocessing
 import psutil
 
@@ -22,24 +26,95 @@ logging.basicConfig(
     force=True  # Ensures existing handlers are replaced
 )
 
+#FETCH_MODE=async switches score fetching to the pooled asyncio client in modules/async_fetch.py
+FETCH_MODE = os.getenv('FETCH_MODE', 'threaded')
+ASYNC_MAX_IN_FLIGHT = int(os.getenv('ASYNC_MAX_IN_FLIGHT', 200))
+FETCH_MAX_WORKERS = int(os.getenv('FETCH_MAX_WORKERS')) if os.getenv('FETCH_MAX_WORKERS') else None
+SCORE_ENDPOINTS = ['Group', 'Standard', 'No_Standard']
+
+#END_DATE fixes date_taken_end (default: today). HTTP_CACHE_MODE=replay needs it set to the day the cache was filled,
+#since date_taken_end is part of every cached request
+END_DATE = os.getenv('END_DATE') or None
+
+#INCREMENTAL=1 only requests rows from each assessment's date_taken watermark and merges them into the prior output
+INCREMENTAL = os.getenv('INCREMENTAL', '0') == '1'
+INCREMENTAL_STATE_PATH = os.getenv('INCREMENTAL_STATE_PATH', 'gs://illuminatebucket-icefschools-1/state')
+#Runs without INCREMENTAL leave the state alone. INCREMENTAL_RESET=1 fetches everything from START_DATE and overwrites
+#the stored watermarks and outputs, e.g. after deletions upstream or when switching a job over to incremental runs
+INCREMENTAL_RESET = os.getenv('INCREMENTAL_RESET', '0') == '1'
+
+#OUTPUT_MODE=wide (default) keeps the current illuminate_assessment_results file, star writes an assessments
+#dimension plus a slim fact table and a compatibility view, both writes all three
+OUTPUT_MODE = os.getenv('OUTPUT_MODE', 'wide')
+
+#PARTITIONED_OUTPUT=1 writes only the current year of each yearly table to {table}/year={years_data}/ and exposes
+#all years through a manifest and a {table}_all_years view, instead of re-reading and re-uploading prior years
+PARTITIONED_OUTPUT = os.getenv('PARTITIONED_OUTPUT', '0') == '1'
+YEARLY_TABLES = ['assessment_results_group', 'assessment_results_combined', 'illuminate_assessment_results']
+
+
+def fetch_assessment_results(access_token, assessment_id_list, endpoint_list, start_date, end_date_override=None, start_date_overrides=None, spool=None):
+    #All endpoints share a single worker pool (or event loop), returns endpoint -> (frame, log)
+    if FETCH_MODE == 'async':
+        from modules.async_fetch import parallel_get_assessment_results_async
+        return parallel_get_assessment_results_async(access_token, assessment_id_list, endpoint_list, start_date, end_date_override, max_in_flight=ASYNC_MAX_IN_FLIGHT, start_date_overrides=start_date_overrides, spool=spool)
+    return parallel_get_assessment_results_threaded(access_token, assessment_id_list, endpoint_list, start_date, end_date_override, max_workers=FETCH_MAX_WORKERS, start_date_overrides=start_date_overrides, spool=spool)
+
+
+def send_output(bucket_name, frame, name, project_id, blob_path=None):
+    #Streams the frame to the bucket as OUTPUT_FORMAT (csv or parquet) and returns the bytes written
+    if frame.empty:
+        logging.info(f'No data present in {name} file')
+        return 0
+    blob_path = blob_path or frame_file_name(name, OUTPUT_FORMAT)
+    return write_frame_to_gcs(bucket_name, blob_path, frame, fmt=OUTPUT_FORMAT, project_id=project_id)
+
+
 def get_assessment_results(years_data, start_date, end_date_override=None):
     logging.info('\n\n-------------New Illuminate Operations Logging Instance')
     logging.info(f"Available CPUs: {multiprocessing.cpu_count()}")
     logging.info(f"Available RAM: {round(psutil.virtual_memory().total / (1024 ** 3), 2)} GB")
     logging.info(f'Years Data variable passed in is {years_data}')
-
-    access_token, expires_in = get_access_token()
-
-    assessments_metadata, assessment_id_list = get_all_assessments_metadata(access_token)
-    assessment_id_list = list(set(assessment_id_list))
-    if '115538' in assessment_id_list: #Faulty assessment_id that causes issues.
-        assessment_id_list.remove('115538')
-
-    logging.info(f'Here is the length of the assessment_id_list variable {len(assessment_id_list)}')
-
-    assessment_results_group, log_results_group = parallel_get_assessment_scores_threaded(access_token, assessment_id_list, 'Group', start_date, end_date_override)
-    test_results_standard, log_results_standard = parallel_get_assessment_scores_threaded(access_token, assessment_id_list, 'Standard', start_date, end_date_override)
-    test_results_no_standard, log_results_no_standard = parallel_get_assessment_scores_threaded(access_token, assessment_id_list, 'No_Standard', start_date, end_date_override)
+    logging.info(f'Fetch mode is {FETCH_MODE}')
+    if response_cache is not None and response_cache.mode == 'replay' and not end_date_override:
+        logging.warning('HTTP_CACHE_MODE=replay without END_DATE only matches responses cached today')
+
+    #Shared by every worker, refreshes ahead of expiry and after a 401
+    access_token = TokenManager()
+    access_token.get_token()
+
+    with stage('fetch'):
+        assessments_metadata, assessment_id_list = get_all_assessments_metadata(access_token)
+        assessment_id_list = list(set(assessment_id_list))
+        if '115538' in assessment_id_list: #Faulty assessment_id that causes issues.
+            assessment_id_list.remove('115538')
+
+        logging.info(f'Here is the length of the assessment_id_list variable {len(assessment_id_list)}')
+
+        incremental_state = None
+        start_date_overrides = None
+        if INCREMENTAL or INCREMENTAL_RESET:
+            from modules.watermarks import IncrementalState
+            incremental_state = IncrementalState(INCREMENTAL_STATE_PATH, years_data, reset=INCREMENTAL_RESET)
+            start_date_overrides = incremental_state.start_dates(assessment_id_list, SCORE_ENDPOINTS, start_date)
+
+        #With FETCH_SPOOL_PATH set, a rerun of the same day and parameters resumes from the work items already fetched
+        spool = fetch_spool_from_env(years_data, start_date, end_date_override, endpoints=SCORE_ENDPOINTS, incremental=INCREMENTAL and not INCREMENTAL_RESET)
+        fetched = fetch_assessment_results(access_token, assessment_id_list, SCORE_ENDPOINTS, start_date, end_date_override, start_date_overrides, spool)
+
+        if incremental_state is not None:
+            fetched = {endpoint: (incremental_state.merge(endpoint, frame), log) for endpoint, (frame, log) in fetched.items()}
+            incremental_state.save()
+        assessment_results_group, log_results_group = fetched['Group']
+        test_results_standard, log_results_standard = fetched['Standard']
+        test_results_no_standard, log_results_no_standard = fetched['No_Standard']
+        for endpoint, (_, log) in fetched.items():
+            run_report.add_fetch_log(endpoint, log)
+
+    failed_requests = sum(int((log['Status_Code'] != 200).sum()) for _, log in fetched.values() if not log.empty)
+    if failed_requests:
+        logging.error(f'{failed_requests} assessment requests still failed after retries, see Status_Code in the fetch logs')
+    logging.info(f'Adaptive limiter finished at concurrency {int(rate_limiter.limit)} after {rate_limiter.retries} retries')
 
     logging.info(f'Here is the length of the assessment_results_group variable {len(assessment_results_group)}')
     logging.info(f'Here is the length of the test_results_standard variable {len(test_results_standard)}')
@@ -51,10 +126,13 @@ def get_assessment_results(years_data, start_date, end_date_override=None):
     and len(test_results_no_standard) == 0
     ):
         logging.info("All assessment result frames are empty. No results for this year yet. Exiting task successfully.")
+        if spool is not None:
+            spool.clear()
         return  # Task ends and is marked as success. No results for this year yet. 
 
-    assessment_results_combined = bring_together_test_results(test_results_no_standard, test_results_standard)
-    illuminate_assessment_results = create_test_results_view(assessment_results_combined)
+    with stage('combine'):
+        assessment_results_combined = bring_together_test_results(test_results_no_standard, test_results_standard)
+    illuminate_assessment_results = create_test_results_view(assessment_results_combined, years_data)
     
     assessment_results_group['year'] = years_data
     assessment_results_combined['year'] = years_data
@@ -69,77 +147,92 @@ def get_assessment_results(years_data, start_date, end_date_override=None):
     )
 
 
-    appender = yoy.YearlyDataAppender(
-        project_id="icef-437920",
-        dataset_id="illuminate",
-        bucket_name="historicalbucket-icefschools-1"
-    )
-
-    assessment_results_group = appender.load_and_append(
-        table_name="assessment_results_group",
-        blob_paths_old=[
-            "illuminate/assessment_results_group_23-24.csv",
-            "illuminate/assessment_results_group_24-25.csv"
-        ],
-        current_df=assessment_results_group
-    )
-
-    assessment_results_combined = appender.load_and_append(
-        table_name="assessment_results_combined",
-        blob_paths_old=[
-            "illuminate/assessment_results_combined_23-24.csv",
-            "illuminate/assessment_results_combined_24-25.csv"
-        ],
-        current_df=assessment_results_combined
-    )
-
-    illuminate_assessment_results = appender.load_and_append(
-        table_name="illuminate_assessment_results",
-        blob_paths_old=[
-            "illuminate/illuminate_assessment_results_23-24.csv",
-            "illuminate/illuminate_assessment_results_24-25.csv"
-        ],
-        current_df=illuminate_assessment_results
-    )
+    with stage('append'):
+        if not PARTITIONED_OUTPUT:
+            appender = yoy.YearlyDataAppender(
+                project_id="icef-437920",
+                dataset_id="illuminate",
+                bucket_name="historicalbucket-icefschools-1"
+            )
+
+            assessment_results_group = appender.load_and_append(
+                table_name="assessment_results_group",
+                blob_paths_old=[
+                    "illuminate/assessment_results_group_23-24.csv",
+                    "illuminate/assessment_results_group_24-25.csv"
+                ],
+                current_df=assessment_results_group
+            )
+
+            assessment_results_combined = appender.load_and_append(
+                table_name="assessment_results_combined",
+                blob_paths_old=[
+                    "illuminate/assessment_results_combined_23-24.csv",
+                    "illuminate/assessment_results_combined_24-25.csv"
+                ],
+                current_df=assessment_results_combined
+            )
+
+            illuminate_assessment_results = appender.load_and_append(
+                table_name="illuminate_assessment_results",
+                blob_paths_old=[
+                    "illuminate/illuminate_assessment_results_23-24.csv",
+                    "illuminate/illuminate_assessment_results_24-25.csv"
+                ],
+                current_df=illuminate_assessment_results
+            )
 
     logging.info(f'Sending data for {years_data} school year')
     bucket_name = "illuminatebucket-icefschools-1"
     project_id = "icef-437920"
 
-    buckets.send_to_gcs(
-        bucket_name=bucket_name,
-        save_path="",
-        frame=assessment_results_group,
-        frame_name="assessment_results_group.csv",
-        project_id=project_id,
-        dag_name='illuminate_dag'
-    )
-    buckets.send_to_gcs(
-        bucket_name=bucket_name,
-        save_path="",
-        frame=assessment_results_combined,
-        frame_name="assessment_results_combined.csv",
-        project_id=project_id,
-        dag_name='illuminate_dag'
-    )
-    buckets.send_to_gcs(
-        bucket_name=bucket_name,
-        save_path="",
-        frame=illuminate_assessment_results,
-        frame_name="illuminate_assessment_results.csv",
-        project_id=project_id,
-        dag_name='illuminate_dag'
-    )
-    buckets.send_to_gcs(
-        bucket_name=bucket_name,
-        save_path="",
-        frame=assessments_metadata,
-        frame_name="assessments_metadata.csv",
-        project_id=project_id,
-        dag_name='illuminate_dag'
-    )
-
-
-
-get_assessment_results(years_data=os.getenv('YEARS_DATA'),
-                        start_date=os.getenv('START_DATE'))
\ No newline at end of file
+    artifacts = [
+        ("assessment_results_group", assessment_results_group),
+        ("assessment_results_combined", assessment_results_combined),
+    ]
+    if OUTPUT_MODE in ('wide', 'both'):
+        artifacts.append(("illuminate_assessment_results", illuminate_assessment_results))
+    if OUTPUT_MODE in ('star', 'both'):
+        from modules.star_schema import split_dimension_fact, publish_compat_view
+        assessments_dim, assessment_results_fact = split_dimension_fact(illuminate_assessment_results, assessments_metadata)
+        artifacts.append(("illuminate_assessments", assessments_dim))
+        artifacts.append(("illuminate_assessment_results_fact", assessment_results_fact))
+    artifacts.append(("assessments_metadata", assessments_metadata))
+
+    blob_paths = {}
+    if PARTITIONED_OUTPUT:
+        from modules.partitions import partition_blob_path
+        blob_paths = {table: partition_blob_path(table, years_data, OUTPUT_FORMAT) for table in YEARLY_TABLES}
+
+    #All artifacts upload concurrently, any failure fails the run
+    with stage('upload'):
+        uploaded = upload_artifacts(artifacts, lambda frame, name: send_output(bucket_name, frame, name, project_id, blob_paths.get(name)))
+
+    if PARTITIONED_OUTPUT:
+        from modules.partitions import PartitionManifest, publish_logical_table
+        for name, frame in artifacts:
+            if name not in blob_paths or frame.empty:
+                continue
+            manifest = PartitionManifest(bucket_name, name, project_id)
+            manifest.set_partition(years_data, OUTPUT_FORMAT, len(frame), uploaded[name])
+            manifest.save()
+            publish_logical_table(manifest, project_id, 'illuminate')
+
+    if OUTPUT_MODE in ('star', 'both'):
+        star_uris = {name: f'gs://{bucket_name}/{frame_file_name(name, OUTPUT_FORMAT)}' for name in ('illuminate_assessments', 'illuminate_assessment_results_fact')}
+        publish_compat_view(project_id, 'illuminate', 'illuminate_assessments', 'illuminate_assessment_results_fact',
+                            'illuminate_assessment_results_wide', list(assessment_results_fact.columns), star_uris, OUTPUT_FORMAT)
+
+    #Only a failed run needs its spool to resume from
+    if spool is not None:
+        spool.clear()
+
+
+
+try:
+    get_assessment_results(years_data=os.getenv('YEARS_DATA'),
+                            start_date=os.getenv('START_DATE'),
+                            end_date_override=END_DATE)
+finally:
+    #Written for failed runs too, with whatever was recorded up to the failure
+    run_report.write(os.getenv('YEARS_DATA'))
\ No newline at end of file
@@ -1,10 +1,19 @@
 import requests
 import pandas as pd
-import json
 import logging
 from datetime import datetime
 from concurrent.futures import ThreadPoolExecutor, as_completed
+from requests.adapters import HTTPAdapter
+import threading
 import os
+import time
+from .paginator import fetch_pages
+from .http_cache import response_cache_from_env, CacheMissError
+from .rate_control import rate_limiter_from_env
+from .spill import FrameSpillAccumulator
+from .decoders import loads, decode_page, frame_from_pages
+from .dtypes import apply_dtype_policy
+from .run_report import run_report
 
 token_url_illuminate = 'https://icefps.illuminateed.com/live/'
 base_url_illuminate = 'https://icefps.illuminateed.com/live/rest_server.php/Api/'
@@ -12,113 +21,235 @@ current_date = datetime.now()
 current_date = current_date.strftime('%Y-%m-%d')
 #Currently have url_args hardcoded in each function param to be date filtered
 
+SCORES_ENDPOINTS = {
+    'No_Standard': 'AssessmentAggregateStudentResponses',
+    'Standard': 'AssessmentAggregateStudentResponsesStandard',
+    'Group': 'AssessmentAggregateStudentResponsesGroup',
+}
 
-def get_all_assessments_metadata(access_token):
-    # Set the initial page and an empty DataFrame to store all results
-    page = 1
-    all_results = pd.DataFrame()
+LOG_COLUMNS = ['Assessment_ID', 'standard_no_standard', 'Status_Code', 'Assessment_Name', 'Num_of_Pages', 'Num_Of_Tests']
 
-    #To ensure all pages are looped through properly
-    while True:
+HTTP_POOL_SIZE = int(os.getenv('HTTP_POOL_SIZE', 64))
 
-        #Base URL and headers for API requests
-        url_ext = f'Assessments/?page={page}&limit=1000'
-        headers = {"Authorization": f"Bearer {access_token}"}
+_http_session = None
+_http_session_lock = threading.Lock()
 
-        logging.info(f'Fetching data from {base_url_illuminate + url_ext}')
+#Optional on-disk response cache, see modules/http_cache.py. Configured from HTTP_CACHE_* env vars.
+response_cache = response_cache_from_env()
 
-        try:
-            # Make the API request with the current page number
-            response = requests.get(base_url_illuminate + url_ext.format(url_ext), headers=headers)
-            response.raise_for_status()  # Raise exception for HTTP errors
-            
-            results = json.loads(response.content)
 
-            # Check if the required keys are in the response
-            if 'results' not in results or 'num_pages' not in results:
-                logging.error(f"Unexpected API response format: {results}")
-                break
+def configure_response_cache(cache):
+    global response_cache
+    response_cache = cache
 
-            logging.info(f'Here is the total num of pages on this endpoint {results["num_pages"]}')
 
-            # Convert the results of the current page to a DataFrame and append to all_results
-            page_results = pd.DataFrame(results['results'])
-            all_results = pd.concat([all_results, page_results], ignore_index=True)
+#Adaptive concurrency and retry/backoff for 429/5xx, see modules/rate_control.py. Configured from RATE_* env vars.
+rate_limiter = rate_limiter_from_env()
+RETRY_EXCEPTIONS = (requests.ConnectionError, requests.Timeout)
+
+
+def configure_rate_limiter(limiter):
+    global rate_limiter
+    rate_limiter = limiter
+
+
+def get_http_session():
+    """
+    Returns the shared keep-alive session used for every Illuminate request,
+    so worker threads reuse pooled TCP/TLS connections instead of opening a new one per page.
+    """
+    global _http_session
+    if _http_session is None:
+        with _http_session_lock:
+            if _http_session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=4, pool_maxsize=HTTP_POOL_SIZE)
+                session.mount('https://', adapter)
+                session.mount('http://', adapter)
+                session.headers.update({'Accept-Encoding': 'gzip, deflate'})
+                _http_session = session
+    return _http_session
+
+
+def build_scores_url_ext(_id, standard_or_no_standard, start_date, end_date, page):
+    # Returns None if standard_or_no_standard is not one of the known endpoints
+    endpoint = SCORES_ENDPOINTS.get(standard_or_no_standard)
+    if endpoint is None:
+        return None
+    url_args = f'?page={page}&assessment_id={_id}&limit=1000&date_taken_start={start_date}&date_taken_end={end_date}'
+    return f'{endpoint}/{url_args}'
+
+
+def resolve_token(access_token):
+    # access_token is either a plain token string or a shared TokenManager from modules/auth.py
+    return access_token.get_token() if hasattr(access_token, 'get_token') else access_token
+
+
+def illuminate_get(url_ext, access_token):
+    """
+    Single entry point for GET requests against the Illuminate API, served from the response cache when one is configured.
+    When access_token is a TokenManager, a 401 invalidates the token and the request is retried once with a fresh one.
+
+    Returns:
+        tuple: (status_code, parsed results), results is None for unsuccessful calls.
+    """
+    cache = response_cache
+    if cache is not None and cache.enabled:
+        content = cache.get(url_ext)
+        if content is not None:
+            parse_start = time.perf_counter()
+            results = loads(content)
+            run_report.record_request(url_ext, 200, 0.0, len(content), 0, time.perf_counter() - parse_start, cached=True)
+            return 200, results
+
+    attempts = 0
+    start = time.perf_counter()
+    for attempt in range(2):
+        token = resolve_token(access_token)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        def send():
+            nonlocal attempts
+            attempts += 1
+            response = get_http_session().get(base_url_illuminate + url_ext, headers=headers)
+            return response.status_code, response.headers, response.content
+
+        status_code, _, content = rate_limiter.call(send, RETRY_EXCEPTIONS)
+        if status_code == 401 and attempt == 0 and hasattr(access_token, 'invalidate'):
+            logging.warning(f'Received 401 for {url_ext}, refreshing the access token and retrying')
+            access_token.invalidate(token)
+            continue
+        break
+    latency = time.perf_counter() - start
+
+    if status_code != 200:
+        logging.error(f'Request for {url_ext} failed with status {status_code} after retries')
+        run_report.record_request(url_ext, status_code, latency, len(content or b''), attempts - 1, 0.0)
+        return status_code, None
+
+    if cache is not None:
+        cache.put(url_ext, content)
+    parse_start = time.perf_counter()
+    results = loads(content)
+    run_report.record_request(url_ext, status_code, latency, len(content), attempts - 1, time.perf_counter() - parse_start)
+    return status_code, results
+
+
+def handle_scores_response(_id, standard_or_no_standard, page, status_code, results, logging_list, df_results_list):
+    """
+    Processes a single page response for get_assessment_scores, appending to the log list and appending
+    the decoded page to df_results_list. Pages are turned into a frame once by frame_from_pages.
+    Shared by the threaded and asyncio fetch paths so both return the same (df_result, log_df) contract.
+
+    Returns:
+        int: num_pages reported by the API, or None if paging should stop.
+    """
+    r = status_code
+    logging.debug(f'The status code for assessment_id {_id} is {r}')
+
+    # Handle successful API response
+    if r == 200:
+        num_results = results['num_results']
+        num_pages = results['num_pages']
+        logging.debug(f'Here is the num of pages for {_id} id - {num_pages} pages')
+
+        if num_results == 0:
+            # Log and exit if no results are found
+            d = [_id, standard_or_no_standard, r, '', num_pages, num_results]
+            logging_list.append(d)
+            logging.debug(f'Results are NOT present for _id {_id}, num_results {num_results}, page {page}')
+            return None
+
+        # Process and store the results
+        logging.debug(f'Results are present for _id {_id}, num_results {num_results}, page {page}')
+        decode_start = time.perf_counter()
+        decoded_page = decode_page(results['results'])
+        run_report.record_decode(_id, standard_or_no_standard, page, len(results['results']), time.perf_counter() - decode_start)
+        df_results_list.append(decoded_page)
+
+        if page == 1:  # Record details from the first page if there are results
+            title = decoded_page.first('title')
+            d = [_id, standard_or_no_standard, r, title, num_pages, num_results]
+            logging_list.append(d)
+        return num_pages
+
+    # Log unsuccessful API call and exit
+    logging.error(f'API call was not successful for {_id}')
+    d = [_id, standard_or_no_standard, r, '', 0, 0]
+    logging_list.append(d)
+    return None
+
 
-            # Check if we've retrieved all pages
-            if page >= results['num_pages']:
-                logging.info(f'Looped through {page} pages. Results for func get_all_assessments_metadata output into DataFrame')
-                break
+def scores_frame(decoded_pages, standard_or_no_standard):
+    # Builds the per-assessment frame from its decoded pages, coercing and sorting once
+    df_result = frame_from_pages(decoded_pages, standard_or_no_standard)
+    if not df_result.empty:
+        df_result['standard_no_standard'] = standard_or_no_standard
+    return df_result
 
-            # Move to the next page
-            page += 1
 
-        except requests.RequestException as e:
-            logging.error(f"Error fetching page {page}: {e}")
+def get_all_assessments_metadata(access_token):
+
+    def fetch_page(page):
+        url_ext = f'Assessments/?page={page}&limit=1000'
+        logging.info(f'Fetching data from {base_url_illuminate + url_ext}')
+        return illuminate_get(url_ext, access_token)
+
+    try:
+        # Page 1 reports num_pages, the remaining pages are then fetched concurrently
+        pages = fetch_pages(fetch_page)
+    except requests.RequestException as e:
+        logging.error(f"Error fetching Assessments pages: {e}")
+        pages = []
+
+    accumulator = FrameSpillAccumulator(name='assessments_metadata')
+    for page, (status_code, results) in enumerate(pages, start=1):
+        if status_code != 200:
+            logging.error(f"Error fetching page {page}: {status_code}")
             break
-        except KeyError as e:
-            logging.error(f"Key error: {e}")
+
+        # Check if the required keys are in the response
+        if 'results' not in results or 'num_pages' not in results:
+            logging.error(f"Unexpected API response format: {results}")
             break
 
+        if page == 1:
+            logging.info(f'Here is the total num of pages on this endpoint {results["num_pages"]}')
+
+        accumulator.append(frame_from_pages([decode_page(results['results'])], 'Assessments', sort_by=None))
+
+    logging.info(f'Looped through {page if pages else 0} pages. Results for func get_all_assessments_metadata output into DataFrame')
+    all_results = accumulator.result().to_pandas()
 
     assessment_id_list = list(all_results['assessment_id'].unique())
     return(all_results, assessment_id_list)
 
 
 def get_single_assessment(access_token, _id, standard_or_no_standard, start_date, end_date_override=None):
-    # Set the initial page and an empty DataFrame to store all results
 
     effective_end_date = end_date_override if end_date_override else current_date
 
-    page = 1
-    all_results = pd.DataFrame()
-
-    url_args = f'?page={page}&assessment_id={_id}&limit=1000&date_taken_start={start_date}&date_taken_end={effective_end_date}'
-    
-
     # Determine the endpoint based on the standard_or_no_standard parameter
-    if standard_or_no_standard == 'No_Standard':
-        url_ext = f'AssessmentAggregateStudentResponses/{url_args}'
-    elif standard_or_no_standard == 'Standard':
-        url_ext = f'AssessmentAggregateStudentResponsesStandard/{url_args}'
-    else:
+    if standard_or_no_standard not in ('No_Standard', 'Standard'):
         print('Wrong variable for standard_or_no_standard')
         return None  # Exit the function if the parameter is incorrect
-    
-    logging.info(f'Here is the url_args for the get_single_asssessment function {url_ext}')
-
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
 
+    logging.info(f'Here is the url_args for the get_single_asssessment function {build_scores_url_ext(_id, standard_or_no_standard, start_date, effective_end_date, 1)}')
 
-    while True:
-        # Make the API request with the current page number
-        response = requests.get(base_url_illuminate + url_ext, headers=headers)
+    def fetch_page(page):
+        return illuminate_get(build_scores_url_ext(_id, standard_or_no_standard, start_date, effective_end_date, page), access_token)
 
+    # Pages are streamed into the accumulator rather than concatenated onto a growing frame
+    accumulator = FrameSpillAccumulator(name=f'single_assessment_{_id}')
+    for page, (status_code, results) in enumerate(fetch_pages(fetch_page), start=1):
         # Check if the response is successful
-        if response.status_code != 200:
-            logging.error(f"Error fetching page {page}: {response.status_code}")
+        if status_code != 200:
+            logging.error(f"Error fetching page {page}: {status_code}")
             break
+        accumulator.append(pd.DataFrame(results['results']))
 
-        # Parse the response content
-        results = json.loads(response.content)
-
-        # Convert the results of the current page to a DataFrame and append to all_results
-        page_results = pd.DataFrame(results['results'])
-        all_results = pd.concat([all_results, page_results], ignore_index=True)
-
-        # Check if we've retrieved all pages
-        if page >= results.get('num_pages', 1):  # Default to 1 if 'num_pages' is not present
-            logging.info(f'Looped through {page} pages for assessment ID {_id}. Results output into DataFrame.')
-            break
-
-        # Move to the next page
-        page += 1
-        # Update the URL for the next page
-        url_ext = f'AssessmentAggregateStudentResponses{"Standard" if standard_or_no_standard == "Standard" else ""}/{url_args}'
-
-    return all_results
+    logging.info(f'Looped through {page} pages for assessment ID {_id}. Results output into DataFrame.')
+    return accumulator.result().to_pandas()
 
 
 
@@ -128,86 +259,27 @@ def get_assessment_scores(access_token, _id, standard_or_no_standard, start_date
     
 
     # Initialize variables
-    page = 1
     logging_list = []  # List to store logging information
     df_results_list = []  # List to collect results DataFrames
-    headers = {
-        "Authorization": f"Bearer {access_token}"
-    }
-
-
-    while True:
-        # Update the URL arguments to reflect the current page number
-        url_args = f'?page={page}&assessment_id={_id}&limit=1000&date_taken_start={start_date}&date_taken_end={effective_end_date}'
-
-        # Determine the endpoint based on the standard_or_no_standard parameter
-        if standard_or_no_standard == 'No_Standard':
-            url_ext = f'AssessmentAggregateStudentResponses/{url_args}'
-        elif standard_or_no_standard == 'Standard':
-            url_ext = f'AssessmentAggregateStudentResponsesStandard/{url_args}'
-        elif standard_or_no_standard == 'Group':
-            url_ext = f'AssessmentAggregateStudentResponsesGroup/{url_args}'
-        else:
-            print('Wrong variable for standard_or_no_standard')
-            return None, None  # Exit the function if the parameter is incorrect
-        
-        
+
+    if standard_or_no_standard not in SCORES_ENDPOINTS:
+        print('Wrong variable for standard_or_no_standard')
+        return None, None  # Exit the function if the parameter is incorrect
+
+    def fetch_page(page):
+        url_ext = build_scores_url_ext(_id, standard_or_no_standard, start_date, effective_end_date, page)
         logging.debug(base_url_illuminate + url_ext)
-        
-        response = requests.get(base_url_illuminate + url_ext, headers=headers)
-        r = response.status_code
-        logging.debug(f'The status code for assessment_id {_id} is {r}')
-       
-
-
-        # Handle successful API response
-        if r == 200:
-            results = json.loads(response.content)
-            num_results = results['num_results']
-            num_pages = results['num_pages']
-            logging.debug(f'Here is the num of pages for {_id} id - {num_pages} pages')
-
-            if num_results == 0:
-                # Log and exit if no results are found
-                d = [_id, standard_or_no_standard, r, '', num_pages, num_results]
-                logging_list.append(d)
-                logging.debug(f'Results are NOT present for _id {_id}, num_results {num_results}, page {page}')
-                break
-            else:
-                # Process and store the results
-                logging.debug(f'Results are present for _id {_id}, num_results {num_results}, page {page}')
-                df_page_results = pd.DataFrame(results['results'])
-                df_page_results = df_page_results.sort_values(by='date_taken')
-                df_page_results.reset_index(drop=True, inplace=True)
-                df_page_results['percent_correct'] = df_page_results['percent_correct'].astype(float).round().astype(int)
-                df_page_results['date_taken'] = pd.to_datetime(df_page_results['date_taken'])
-                df_page_results['standard_no_standard'] = standard_or_no_standard
-                df_results_list.append(df_page_results)
-
-                if page == 1:  # Record details from the first page if there are results
-                    title = df_page_results.iloc[0]['title']
-                    d = [_id, standard_or_no_standard, r, title, num_pages, num_results]
-                    logging_list.append(d)
-        else:
-            # Log unsuccessful API call and exit
-            num_pages = 0
-            num_results = 0
-            logging.error(f'API call was not successful for {_id}')
-            d = [_id, standard_or_no_standard, r, '', num_pages, num_results]
-            logging_list.append(d)
-            break
+        return illuminate_get(url_ext, access_token)
 
-        # Check if all pages have been retrieved
-        if page >= num_pages:
-            logging.debug(f'Completed fetching for assessment ID {_id}.')
+    # Page 1 reports num_pages, pages 2..N are then fetched concurrently and come back in page order
+    for page, (status_code, results) in enumerate(fetch_pages(fetch_page), start=1):
+        num_pages = handle_scores_response(_id, standard_or_no_standard, page, status_code, results, logging_list, df_results_list)
+        if num_pages is None:
             break
+    logging.debug(f'Completed fetching for assessment ID {_id}.')
 
-        # Increment the page number for the next iteration
-        page += 1
-
-    # Concatenate all DataFrames in the list into a single DataFrame
-    df_result = pd.concat(df_results_list, ignore_index=True) if df_results_list else pd.DataFrame()
-    t = pd.DataFrame(logging_list, columns=['Assessment_ID', 'standard_no_standard', 'Status_Code', 'Assessment_Name', 'Num_of_Pages', 'Num_Of_Tests'])
+    df_result = scores_frame(df_results_list, standard_or_no_standard)
+    t = pd.DataFrame(logging_list, columns=LOG_COLUMNS)
 
     return df_result, t
 
@@ -257,28 +329,77 @@ def parallel_get_assessment_scores_threaded(
     Parallelize API calls using threads (best for I/O-bound tasks like HTTP requests).
     Dynamically adjusts the number of threads based on CPU availability.
     """
+    results = parallel_get_assessment_results_threaded(
+        access_token, assessment_id_list, [standard_or_no_standard], start_date, end_date_override, max_workers
+    )
+    return results[standard_or_no_standard]
+
+
+def parallel_get_assessment_results_threaded(
+    access_token, assessment_id_list, endpoint_list, start_date,
+    end_date_override=None, max_workers=None, start_date_overrides=None, spool=None
+):
+    """
+    Runs every (assessment_id, endpoint) work item through one shared thread pool,
+    so no endpoint waits on the slowest assessment of the one before it.
+    start_date_overrides maps (assessment_id, endpoint) to its own date_taken_start, used for incremental runs.
+    With a FetchSpool, items already in the spool are read back instead of fetched, and each fetched item
+    is written to the spool by its worker as soon as it finishes.
+
+    Returns:
+        dict: endpoint -> (final_df, final_logs), in the same shape as parallel_get_assessment_scores_threaded.
+    """
     # Dynamically determine number of workers
     if max_workers is None:
         max_workers = min(32, (os.cpu_count() or 1) + 4)
 
-    def fetch(_id):
-        return get_assessment_scores(access_token, _id, standard_or_no_standard, start_date, end_date_override)
+    work_items = [(_id, endpoint) for endpoint in endpoint_list for _id in assessment_id_list]
+    logging.info(f"Scheduling {len(work_items)} work items across endpoints {endpoint_list} on {max_workers} workers")
+
+    start_date_overrides = start_date_overrides or {}
+    spooled = spool.completed(endpoint_list) if spool is not None else set()
 
-    all_results = []
-    all_logs = []
+    def fetch(item):
+        _id, endpoint = item
+        if (str(_id), endpoint) in spooled:
+            cached = spool.get((str(_id), endpoint))
+            if cached is not None:
+                return cached
+        item_start_date = start_date_overrides.get(item, start_date)
+        df_result, t = get_assessment_scores(access_token, _id, endpoint, item_start_date, end_date_override)
+        if spool is not None:
+            spool.put((str(_id), endpoint), df_result, t)
+        return df_result, t
+
+    # Finished assessments are spilled to disk past SPILL_MEMORY_BUDGET_MB rather than held until the end
+    all_results = {endpoint: FrameSpillAccumulator(name=f'assessment_results_{endpoint}') for endpoint in endpoint_list}
+    all_logs = {endpoint: [] for endpoint in endpoint_list}
 
     with ThreadPoolExecutor(max_workers=max_workers) as executor:
-        future_to_id = {executor.submit(fetch, _id): _id for _id in assessment_id_list}
-        for future in as_completed(future_to_id):
+        future_to_item = {executor.submit(fetch, item): item for item in work_items}
+        for future in as_completed(future_to_item):
+            _id, endpoint = future_to_item[future]
             try:
                 df_result, t = future.result()
-                all_results.append(df_result)
-                all_logs.append(t)
+                all_results[endpoint].append(df_result)
+                all_logs[endpoint].append(t)
+            except CacheMissError:
+                # A replay run must not carry on with partial data, stop scheduling and fail the run
+                for pending in future_to_item:
+                    pending.cancel()
+                raise
             except Exception as e:
-                logging.error(f"Error fetching assessment ID {future_to_id[future]}: {e}")
+                logging.error(f"Error fetching assessment ID {_id} for {endpoint}: {e}")
+
+    return {endpoint: combine_results(all_results[endpoint], all_logs[endpoint]) for endpoint in endpoint_list}
+
 
-    final_df = pd.concat(all_results, ignore_index=True) if all_results else pd.DataFrame()
-    final_logs = pd.concat(all_logs, ignore_index=True) if all_logs else pd.DataFrame()
+def combine_results(results, logs_list):
+    # results is a FrameSpillAccumulator, only loaded back into a single frame once every work item is done
+    spilled = results.result()
+    final_df = apply_dtype_policy(spilled.to_pandas(), name='fetched results', report=True)
+    spilled.cleanup()
+    final_logs = pd.concat(logs_list, ignore_index=True) if logs_list else pd.DataFrame()
     return final_df, final_logs
 
 
@@ -0,0 +1,184 @@
+import asyncio
+import logging
+import time
+import pandas as pd
+import aiohttp
+from . import assessments_endpoints as endpoints
+from .paginator import fetch_pages_async
+from .spill import FrameSpillAccumulator
+from .decoders import loads
+from .http_cache import CacheMissError
+from .run_report import run_report
+
+#Optional asyncio fetch mode. One pooled keep-alive client is shared by every request, and
+#max_in_flight bounds how many requests are open against Illuminate at the same time.
+DEFAULT_MAX_IN_FLIGHT = 200
+RETRY_EXCEPTIONS = (aiohttp.ClientConnectionError, asyncio.TimeoutError)
+
+
+def create_client_session(max_in_flight=DEFAULT_MAX_IN_FLIGHT):
+    """
+    Builds the shared aiohttp client. The connector keeps connections alive between pages
+    and its limit matches max_in_flight so the pool never opens more sockets than requests allowed.
+    """
+    connector = aiohttp.TCPConnector(limit=max_in_flight, limit_per_host=max_in_flight, keepalive_timeout=60)
+    timeout = aiohttp.ClientTimeout(total=300)
+    return aiohttp.ClientSession(
+        connector=connector,
+        timeout=timeout,
+        headers={'Accept-Encoding': 'gzip, deflate'},
+        auto_decompress=True
+    )
+
+
+async def resolve_token_async(access_token):
+    # access_token is either a plain token string or a shared TokenManager from modules/auth.py
+    return await access_token.get_token_async() if hasattr(access_token, 'get_token_async') else access_token
+
+
+async def fetch_url_ext(session, semaphore, access_token, url_ext):
+    # Returns (status_code, parsed results) for a single Illuminate request, results is None on failure
+    cache = endpoints.response_cache
+    if cache is not None and cache.enabled:
+        content = await asyncio.to_thread(cache.get, url_ext)
+        if content is not None:
+            parse_start = time.perf_counter()
+            results = loads(content)
+            run_report.record_request(url_ext, 200, 0.0, len(content), 0, time.perf_counter() - parse_start, cached=True)
+            return 200, results
+
+    attempts = 0
+    start = time.perf_counter()
+    for attempt in range(2):
+        token = await resolve_token_async(access_token)
+        headers = {"Authorization": f"Bearer {token}"}
+
+        async def send():
+            nonlocal attempts
+            attempts += 1
+            async with semaphore:
+                async with session.get(endpoints.base_url_illuminate + url_ext, headers=headers) as response:
+                    return response.status, response.headers, await response.read()
+
+        status_code, _, content = await endpoints.rate_limiter.call_async(send, RETRY_EXCEPTIONS)
+        if status_code == 401 and attempt == 0 and hasattr(access_token, 'invalidate'):
+            logging.warning(f'Received 401 for {url_ext}, refreshing the access token and retrying')
+            access_token.invalidate(token)
+            continue
+        break
+    latency = time.perf_counter() - start
+
+    if status_code != 200:
+        logging.error(f'Request for {url_ext} failed with status {status_code} after retries')
+        run_report.record_request(url_ext, status_code, latency, len(content or b''), attempts - 1, 0.0)
+        return status_code, None
+
+    if cache is not None:
+        await asyncio.to_thread(cache.put, url_ext, content)
+    parse_start = time.perf_counter()
+    results = loads(content)
+    run_report.record_request(url_ext, status_code, latency, len(content), attempts - 1, time.perf_counter() - parse_start)
+    return status_code, results
+
+
+async def get_assessment_scores_async(session, semaphore, access_token, _id, standard_or_no_standard, start_date, end_date_override=None):
+    """
+    Asyncio counterpart of get_assessment_scores. Returns the same (df_result, log_df) contract.
+    """
+    effective_end_date = end_date_override if end_date_override else endpoints.current_date
+
+    logging_list = []
+    df_results_list = []
+
+    if standard_or_no_standard not in endpoints.SCORES_ENDPOINTS:
+        logging.error(f'Wrong variable for standard_or_no_standard {standard_or_no_standard}')
+        return None, None
+
+    async def fetch_page(page):
+        url_ext = endpoints.build_scores_url_ext(_id, standard_or_no_standard, start_date, effective_end_date, page)
+        logging.debug(endpoints.base_url_illuminate + url_ext)
+        return await fetch_url_ext(session, semaphore, access_token, url_ext)
+
+    for page, (status_code, results) in enumerate(await fetch_pages_async(fetch_page), start=1):
+        num_pages = endpoints.handle_scores_response(_id, standard_or_no_standard, page, status_code, results, logging_list, df_results_list)
+        if num_pages is None:
+            break
+    logging.debug(f'Completed fetching for assessment ID {_id}.')
+
+    df_result = endpoints.scores_frame(df_results_list, standard_or_no_standard)
+    t = pd.DataFrame(logging_list, columns=endpoints.LOG_COLUMNS)
+
+    return df_result, t
+
+
+async def gather_assessment_results(access_token, assessment_id_list, endpoint_list, start_date, end_date_override=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT, start_date_overrides=None, spool=None):
+    """
+    Runs every (assessment_id, endpoint) work item on one event loop and one client session.
+    Spool reads and writes run in worker threads so they do not stall the event loop.
+
+    Returns:
+        dict: endpoint -> (final_df, final_logs)
+    """
+    semaphore = asyncio.Semaphore(max_in_flight)
+    all_results = {endpoint: FrameSpillAccumulator(name=f'assessment_results_{endpoint}') for endpoint in endpoint_list}
+    all_logs = {endpoint: [] for endpoint in endpoint_list}
+    work_items = [(_id, endpoint) for endpoint in endpoint_list for _id in assessment_id_list]
+    start_date_overrides = start_date_overrides or {}
+    spooled = await asyncio.to_thread(spool.completed, endpoint_list) if spool is not None else set()
+
+    async with create_client_session(max_in_flight) as session:
+
+        async def fetch(item):
+            _id, endpoint = item
+            try:
+                if (str(_id), endpoint) in spooled:
+                    cached = await asyncio.to_thread(spool.get, (str(_id), endpoint))
+                    if cached is not None:
+                        return cached
+                item_start_date = start_date_overrides.get(item, start_date)
+                df_result, t = await get_assessment_scores_async(session, semaphore, access_token, _id, endpoint, item_start_date, end_date_override)
+                if spool is not None:
+                    await asyncio.to_thread(spool.put, (str(_id), endpoint), df_result, t)
+                return df_result, t
+            except CacheMissError:
+                # A replay run must not carry on with partial data
+                raise
+            except Exception as e:
+                logging.error(f"Error fetching assessment ID {_id} for {endpoint}: {e}")
+                return None, None
+
+        async def fetch_and_collect(item):
+            # Collect as each item finishes so completed frames can spill instead of piling up in gather's result list
+            df_result, t = await fetch(item)
+            if df_result is not None:
+                all_results[item[1]].append(df_result)
+                all_logs[item[1]].append(t)
+
+        await asyncio.gather(*(fetch_and_collect(item) for item in work_items))
+
+    return {endpoint: endpoints.combine_results(all_results[endpoint], all_logs[endpoint]) for endpoint in endpoint_list}
+
+
+def parallel_get_assessment_results_async(
+    access_token, assessment_id_list, endpoint_list, start_date,
+    end_date_override=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT, start_date_overrides=None, spool=None
+):
+    logging.info(f"Starting parallel_get_assessment_results_async for {endpoint_list} with start_date={start_date}, end_date_override={end_date_override}, max_in_flight={max_in_flight}")
+
+    return asyncio.run(gather_assessment_results(
+        access_token, assessment_id_list, endpoint_list, start_date, end_date_override, max_in_flight, start_date_overrides, spool
+    ))
+
+
+def parallel_get_assessment_scores_async(
+    access_token, assessment_id_list, standard_or_no_standard, start_date,
+    end_date_override=None, max_in_flight=DEFAULT_MAX_IN_FLIGHT
+):
+    """
+    Drop-in alternative to parallel_get_assessment_scores_threaded that runs every page request
+    on one event loop, keeping up to max_in_flight requests open through a single pooled client.
+    """
+    results = parallel_get_assessment_results_async(
+        access_token, assessment_id_list, [standard_or_no_standard], start_date, end_date_override, max_in_flight
+    )
+    return results[standard_or_no_standard]
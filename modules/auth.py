@@ -1,5 +1,8 @@
 import requests
 import logging
+import threading
+import asyncio
+import time
 from .access_secrets import *
 
 J_CLIENT_ID = access_secret_version('icef-437920', 'illuminate_client_id', version_id="latest")
@@ -10,6 +13,7 @@ base_url_illuminate = 'https://icefps.illuminateed.com/live/rest_server.php/Api/
 # Configuration
 TOKEN_URL = f'{token_url_illuminate}?OAuth2_AccessToken'
 TOKEN_EXPIRY = 3600  # Token expiry time in seconds (1 hour)
+TOKEN_REFRESH_MARGIN = 300  # Refresh this many seconds before the token expires
 
 def get_access_token():
     # Prepare the payload for the token request
@@ -41,4 +45,47 @@ def get_access_token():
         logging.error(f'Failed to obtain access token: {response.status_code} {response.text}')
         print('Failed to obtain access token:', response.status_code, response.text)
         return None, None
-        
\ No newline at end of file
+        
+
+class TokenManager:
+    """
+    Shared access token provider for long-running fetches.
+
+    The token is refreshed refresh_margin seconds ahead of its expiry, and invalidate() lets a
+    worker that received a 401 force a refresh. A lock ensures only one refresh happens at a time
+    across threads; get_token_async runs the same refresh off the event loop.
+    """
+
+    def __init__(self, fetch_token=get_access_token, refresh_margin=TOKEN_REFRESH_MARGIN):
+        self._fetch_token = fetch_token
+        self.refresh_margin = refresh_margin
+        self._token = None
+        self._expires_at = 0.0
+        self._lock = threading.Lock()
+
+    def _is_fresh(self):
+        return self._token is not None and time.monotonic() < self._expires_at - self.refresh_margin
+
+    def get_token(self):
+        if self._is_fresh():
+            return self._token
+        with self._lock:
+            if not self._is_fresh():
+                access_token, expires_in = self._fetch_token()
+                if access_token is None:
+                    raise Exception('Unable to refresh the Illuminate access token')
+                self._token = access_token
+                self._expires_at = time.monotonic() + float(expires_in or TOKEN_EXPIRY)
+                logging.info(f'Refreshed API token, valid for {expires_in} seconds')
+            return self._token
+
+    async def get_token_async(self):
+        if self._is_fresh():
+            return self._token
+        return await asyncio.to_thread(self.get_token)
+
+    def invalidate(self, access_token):
+        # Only drop the token if it is the one that was rejected, so concurrent 401s trigger a single refresh
+        with self._lock:
+            if self._token == access_token:
+                self._token = None
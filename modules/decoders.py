@@ -0,0 +1,104 @@
+import logging
+from operator import itemgetter
+import numpy as np
+import pandas as pd
+
+try:
+    import orjson
+
+    def loads(content):
+        return orjson.loads(content)
+except ImportError:
+    import json
+
+    def loads(content):
+        return json.loads(content)
+
+#The only coercions applied while decoding, keyed by column and shared by the score endpoints (Assessments metadata
+#is passed through untouched). Every other column is passed through as parsed. Typing and compaction happen later, in modules/dtypes.apply_dtype_policy.
+COERCIONS = {
+    'date_taken': 'datetime',
+    'percent_correct': 'rounded_int',
+}
+
+
+class DecodedPage:
+    """
+    One page of results transposed into column lists. Holds no pandas objects, so decoding a page is a single pass.
+    """
+
+    __slots__ = ('columns', 'num_rows')
+
+    def __init__(self, columns, num_rows):
+        self.columns = columns
+        self.num_rows = num_rows
+
+    def first(self, column):
+        values = self.columns.get(column)
+        return values[0] if values else None
+
+
+def decode_page(rows):
+    """
+    Transposes a list of row dicts into {column: list}. Rows that share the first row's keys
+    (the normal case) go through a C-level itemgetter transpose; otherwise missing keys become NaN.
+    """
+    if not rows:
+        return DecodedPage({}, 0)
+
+    names = list(rows[0].keys())
+    try:
+        if len(names) == 1:
+            columns = {names[0]: [row[names[0]] for row in rows]}
+        else:
+            columns = dict(zip(names, map(list, zip(*map(itemgetter(*names), rows)))))
+    except KeyError:
+        # Ragged page, fall back to the union of keys in order of appearance
+        for row in rows:
+            for name in row:
+                if name not in names:
+                    names.append(name)
+        columns = {name: [row.get(name, np.nan) for row in rows] for name in names}
+    return DecodedPage(columns, len(rows))
+
+
+def coerce_column(values, kind):
+    if kind == 'rounded_int':
+        return pd.Series(values, dtype=float).round().astype(int)
+    if kind == 'datetime':
+        return pd.to_datetime(pd.Series(values))
+    return values
+
+
+def frame_from_pages(pages, endpoint, sort_by='date_taken'):
+    """
+    Combines decoded pages into one DataFrame, applying COERCIONS and the sort once over the combined
+    result instead of per page.
+    """
+    pages = [page for page in pages if page.num_rows]
+    if not pages:
+        return pd.DataFrame()
+
+    names = []
+    for page in pages:
+        for name in page.columns:
+            if name not in names:
+                names.append(name)
+
+    coercions = {} if endpoint == 'Assessments' else COERCIONS
+    data = {}
+    for name in names:
+        values = []
+        for page in pages:
+            page_values = page.columns.get(name)
+            values.extend(page_values if page_values is not None else [np.nan] * page.num_rows)
+        try:
+            data[name] = coerce_column(values, coercions.get(name))
+        except (TypeError, ValueError) as e:
+            logging.error(f'Unable to coerce column {name} for {endpoint}: {e}')
+            data[name] = values
+
+    frame = pd.DataFrame({name: (col.to_numpy() if isinstance(col, pd.Series) else col) for name, col in data.items()})
+    if sort_by in frame.columns:
+        frame = frame.sort_values(by=sort_by, kind='stable').reset_index(drop=True)
+    return frame
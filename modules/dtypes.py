@@ -0,0 +1,63 @@
+import logging
+import pandas as pd
+
+#Central dtype policy for the fetched, combined and view frames.
+#Low-cardinality text repeated on every row becomes categorical, ids become Arrow-backed strings,
+#and integer / boolean columns are narrowed.
+CATEGORY_COLUMNS = [
+    'assessment_id', 'title', 'curriculum', 'unit', 'unit_labels', 'test_type', 'data_source',
+    'standard_code', 'standard_description', 'academic_benchmark_guid', 'performance_band_level',
+    'performance_band_label', 'proficiency', 'standard_no_standard', 'version_label', 'year',
+]
+STRING_COLUMNS = ['local_student_id']
+INTEGER_COLUMNS = ['percent_correct', 'score', '__count', 'version']
+BOOL_COLUMNS = ['mastered']
+
+try:
+    import pyarrow  # noqa: F401
+    STRING_DTYPE = 'string[pyarrow]'
+except ImportError:
+    STRING_DTYPE = 'string'
+
+
+def bytes_per_row(df):
+    if len(df) == 0:
+        return 0.0
+    return float(df.memory_usage(deep=True, index=False).sum()) / len(df)
+
+
+def apply_dtype_policy(df, name='frame', report=False):
+    """
+    Applies the dtype policy in place to whichever policy columns df has, and returns df.
+    With report=True the bytes per row before and after are logged.
+    """
+    if df is None or df.empty:
+        return df
+
+    before = bytes_per_row(df) if report else None
+
+    for column in CATEGORY_COLUMNS:
+        if column in df.columns and not isinstance(df[column].dtype, pd.CategoricalDtype):
+            df[column] = df[column].astype('category')
+
+    for column in STRING_COLUMNS:
+        if column in df.columns and df[column].dtype == object:
+            df[column] = df[column].astype(STRING_DTYPE)
+
+    for column in INTEGER_COLUMNS:
+        if column in df.columns and pd.api.types.is_integer_dtype(df[column]):
+            df[column] = pd.to_numeric(df[column], downcast='integer')
+
+    for column in BOOL_COLUMNS:
+        # Only columns that already hold Python bools, so 0/1 columns keep writing as 0/1
+        if column in df.columns and df[column].dtype == object and df[column].map(type).eq(bool).all():
+            df[column] = df[column].astype(bool)
+
+    if report:
+        logging.info(f'{name}: {round(before, 1)} bytes/row before dtype policy, {round(bytes_per_row(df), 1)} after, {len(df)} rows')
+    return df
+
+
+def as_object(series):
+    # Categorical text columns do not support string concatenation or new values, operate on them as object
+    return series.astype(object) if isinstance(series.dtype, pd.CategoricalDtype) else series
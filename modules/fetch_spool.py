@@ -0,0 +1,112 @@
+import hashlib
+import io
+import json
+import logging
+import os
+from datetime import date
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .watermarks import read_bytes, write_bytes, list_names, join_path, delete_tree
+
+#FETCH_SPOOL_PATH (a local directory or gs://bucket/prefix) checkpoints every finished work item,
+#so a rerun with the same parameters after a crash only fetches what is missing. The spool is deleted once a run succeeds.
+FETCH_SPOOL_PATH = os.getenv('FETCH_SPOOL_PATH')
+SPOOL_SUFFIX = '.parquet'
+SPOOL_METADATA_KEY = b'illuminate_spool'
+
+
+def run_key(params):
+    # Stable id for a set of run parameters, e.g. years_data, start_date and end_date_override
+    encoded = json.dumps(params, sort_keys=True, default=str).encode('utf-8')
+    return hashlib.sha256(encoded).hexdigest()[:16]
+
+
+class FetchSpool:
+    """
+    Durable record of the finished (assessment_id, endpoint) work items of one run.
+
+    Each item is written as Parquet as soon as it is fetched, with its log rows and the frame's dtypes as JSON
+    in the schema metadata, so the resumed frames match freshly fetched ones, dtypes included. Items with a
+    non-200 page in their log, or that Arrow cannot write, are not recorded and are fetched again on the rerun.
+
+    Layout:
+        {root}/{run_key}/params.json
+        {root}/{run_key}/{endpoint}/{assessment_id}.parquet
+    """
+
+    def __init__(self, root, params):
+        self.root = join_path(root, run_key(params))
+        self.params = params
+        write_bytes(join_path(self.root, 'params.json'), json.dumps(params, sort_keys=True, default=str, indent=2).encode('utf-8'))
+
+    def item_path(self, item):
+        _id, endpoint = item
+        return join_path(self.root, endpoint, f'{_id}{SPOOL_SUFFIX}')
+
+    def completed(self, endpoint_list):
+        # Set of (assessment_id, endpoint) already in the spool
+        done = set()
+        for endpoint in endpoint_list:
+            for name in list_names(join_path(self.root, endpoint)):
+                if name.endswith(SPOOL_SUFFIX):
+                    done.add((name[:-len(SPOOL_SUFFIX)], endpoint))
+        logging.info(f'Fetch spool {self.root} holds {len(done)} completed work items')
+        return done
+
+    def put(self, item, df_result, t):
+        if t is not None and 'Status_Code' in t.columns and not (t['Status_Code'] == 200).all():
+            return False
+        frame = df_result if df_result is not None else pd.DataFrame()
+        log = t if t is not None else pd.DataFrame()
+        metadata = {
+            'dtypes': {str(column): str(dtype) for column, dtype in frame.dtypes.items()},
+            'log': {'columns': list(log.columns), 'dtypes': {column: str(dtype) for column, dtype in log.dtypes.items()},
+                    'data': log.to_dict(orient='split')['data']},
+        }
+        try:
+            table = pa.Table.from_pandas(frame)
+        except (pa.ArrowException, ValueError) as e:
+            logging.warning(f'Unable to spool {item} due to {e}, it will be fetched again on a rerun')
+            return False
+        table = table.replace_schema_metadata({**(table.schema.metadata or {}), SPOOL_METADATA_KEY: json.dumps(metadata, default=str).encode('utf-8')})
+        buffer = io.BytesIO()
+        pq.write_table(table, buffer, compression='zstd')
+        write_bytes(self.item_path(item), buffer.getvalue())
+        return True
+
+    def get(self, item):
+        # Returns (df_result, log) as put them, or None if the item is not in the spool
+        raw = read_bytes(self.item_path(item))
+        if raw is None:
+            return None
+        table = pq.read_table(io.BytesIO(raw))
+        metadata = json.loads(table.schema.metadata[SPOOL_METADATA_KEY])
+        frame = table.to_pandas()
+        for column, dtype in metadata['dtypes'].items():
+            if column in frame.columns and str(frame[column].dtype) != dtype:
+                frame[column] = frame[column].astype(dtype)
+        log_meta = metadata['log']
+        log = pd.DataFrame(log_meta['data'], columns=log_meta['columns'])
+        for column, dtype in log_meta['dtypes'].items():
+            if str(log[column].dtype) != dtype:
+                log[column] = log[column].astype(dtype)
+        return frame, log
+
+    def clear(self):
+        # Called once the run has succeeded, a spool is only needed to resume a failed run
+        removed = delete_tree(self.root)
+        logging.info(f'Deleted fetch spool {self.root} ({removed} files)')
+
+
+def fetch_spool_from_env(years_data, start_date, end_date_override=None, **params):
+    """
+    Returns the spool for this run, or None when FETCH_SPOOL_PATH is unset. Without an end_date_override
+    the fetch runs up to today, so the date is part of the key and tomorrow's run starts a fresh spool.
+    """
+    if not FETCH_SPOOL_PATH:
+        return None
+    params = {'years_data': years_data, 'start_date': start_date, 'end_date_override': end_date_override, **params}
+    if end_date_override is None:
+        params['run_date'] = date.today().isoformat()
+    return FetchSpool(FETCH_SPOOL_PATH, params)
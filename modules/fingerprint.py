@@ -0,0 +1,107 @@
+import logging
+import os
+import pandas as pd
+
+#Row fingerprints stand in for drop_duplicates over wide, mixed-dtype frames: each row is hashed once over a
+#declared key and only the hash is compared. FINGERPRINT_BITS=128 adds a second, independently keyed hash.
+FINGERPRINT_BITS = int(os.getenv('FINGERPRINT_BITS', 64))
+FINGERPRINT_PREFIX = '__fingerprint'
+#The version is part of the column name and is bumped whenever key_text changes, so fingerprints stored by
+#earlier runs (prior-year sidecars, incremental state) are recomputed instead of compared
+FINGERPRINT_VERSION = 2
+FINGERPRINT_COLUMN = f'{FINGERPRINT_PREFIX}_v{FINGERPRINT_VERSION}'
+MISSING_TEXT = 'nan'
+HASH_KEYS = ['illuminate_fp_00', 'illuminate_fp_01']  # hash_pandas_object keys must be 16 bytes
+
+
+def fingerprint_columns(bits=FINGERPRINT_BITS):
+    if bits not in (64, 128):
+        raise ValueError(f'FINGERPRINT_BITS must be 64 or 128, got {bits}')
+    return [FINGERPRINT_COLUMN] if bits == 64 else [FINGERPRINT_COLUMN, f'{FINGERPRINT_COLUMN}_hi']
+
+
+def is_fingerprint_column(column):
+    return str(column).startswith(FINGERPRINT_PREFIX)
+
+
+def key_text(values):
+    # Render a column the same way whether it came from a CSV, a Parquet file or a freshly fetched frame,
+    # so 9, 9.0 and '9' compare equal. How astype(str) renders NaN, None, pd.NA and NaT depends on the dtype
+    # (pandas' str dtype keeps them missing), so missing values are set to MISSING_TEXT explicitly
+    if isinstance(values.dtype, pd.CategoricalDtype):
+        values = values.astype(object)
+    missing = values.isna()
+    text = values.astype(str)
+    if pd.api.types.is_float_dtype(values):
+        integral = ~missing & (values % 1 == 0)
+        text[integral] = values[integral].astype('int64').astype(str)
+    return text.where(~missing, MISSING_TEXT)
+
+
+def fingerprint(df, columns=None, bits=FINGERPRINT_BITS, normalize=False):
+    """
+    Hashes each row of df over columns, by default every column that is not itself a fingerprint.
+
+    Args:
+        df (pd.DataFrame): Frame to fingerprint.
+        columns (list): Declared key. Columns missing from df count as missing values.
+        bits (int): 64 or 128.
+        normalize (bool): Render values as text first so frames from different sources fingerprint alike.
+            Within a single frame the raw dtypes are hashed, which is faster.
+
+    Returns:
+        pd.DataFrame: uint64 columns named by fingerprint_columns(bits), on df's index.
+    """
+    if columns is None:
+        columns = [column for column in df.columns if not is_fingerprint_column(column)]
+    if normalize:
+        keys = pd.DataFrame({column: key_text(df[column]) if column in df.columns else MISSING_TEXT for column in columns}, index=df.index)
+    else:
+        keys = df.reindex(columns=columns)
+    return pd.DataFrame({name: pd.util.hash_pandas_object(keys, index=False, hash_key=hash_key).to_numpy()
+                         for name, hash_key in zip(fingerprint_columns(bits), HASH_KEYS)}, index=df.index)
+
+
+def add_fingerprint(df, columns=None, bits=FINGERPRINT_BITS, normalize=False):
+    # Stores the fingerprint on df so later deduplication and merges reuse it
+    prints = fingerprint(df, columns, bits, normalize)
+    for name in prints.columns:
+        df[name] = prints[name]
+    return df
+
+
+def stored_fingerprint(df, bits=FINGERPRINT_BITS):
+    names = fingerprint_columns(bits)
+    if all(name in df.columns for name in names):
+        return df[names]
+    return None
+
+
+def strip_fingerprint(df):
+    columns = [column for column in df.columns if is_fingerprint_column(column)]
+    return df.drop(columns=columns) if columns else df
+
+
+def isin_fingerprints(prints, existing):
+    # Membership of each row of prints in existing, both as returned by fingerprint
+    if len(prints.columns) == 1:
+        column = prints.columns[0]
+        return prints[column].isin(existing[column].to_numpy()).to_numpy()
+    existing = existing[list(prints.columns)].drop_duplicates()
+    hits = prints.merge(existing, on=list(prints.columns), how='left', indicator=True)
+    return (hits['_merge'] == 'both').to_numpy()
+
+
+def drop_duplicate_rows(df, columns=None, keep='first', bits=FINGERPRINT_BITS, normalize=False, name=None):
+    """
+    drop_duplicates replacement that compares row fingerprints over columns instead of every value.
+    A fingerprint already stored on df is reused when columns is None.
+    """
+    prints = stored_fingerprint(df, bits) if columns is None else None
+    if prints is None:
+        prints = fingerprint(df, columns, bits, normalize)
+    keep_rows = ~prints.duplicated(keep=keep).to_numpy()
+    dropped = len(df) - int(keep_rows.sum())
+    if name and dropped:
+        logging.info(f'{name}: dropped {dropped} duplicate rows of {len(df)}')
+    return df[keep_rows] if dropped else df
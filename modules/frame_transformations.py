@@ -1,108 +1,153 @@
 from .assessments_endpoints import *
-from google.cloud import bigquery
-from google.cloud import storage
 import logging
 import os
 import re
+import numpy as np
+from .overrides import load_override_rules, load_manual_changes, apply_overrides
+from .roster_cache import load_roster, lookup_grade_levels
+from .dtypes import apply_dtype_policy, as_object
+from .gcs_sink import write_frame_to_gcs
+from .history_cache import load_history, append_new_rows
+from .fingerprint import drop_duplicate_rows
+from .run_report import stage
 
 
 
-def add_in_grade_levels(test_results):
-    # Initialize the BigQuery client
-    client = bigquery.Client(project='icef-437920')
+APPLY_MANUAL_CHANGES = os.getenv('APPLY_MANUAL_CHANGES', '0') == '1'
 
-    query_string = '''
-    SELECT DISTINCT 
-    CAST(student_number AS STRING) AS local_student_id,
-    grade_level AS grade_levels
-    FROM `icef-437920.views.student_to_teacher`
-    WHERE year = '25-26'
-    '''
 
-    logging.info(f'Executing BigQuery: {query_string}')
+def add_in_grade_levels(test_results, years_data=None):
+    # Roster for the school year in YEARS_DATA, served from the local roster cache when it is fresh
+    years_data = years_data or os.getenv('YEARS_DATA', '25-26')
+    gl_mapping = load_roster(years_data)
 
-    query_job = client.query(query_string)
-
-    # Convert the query results to a Pandas DataFrame
-    gl_mapping = query_job.result().to_dataframe()
-
-    # Ensure both columns are string type
+    # local_student_id stays a string column in the output
     test_results['local_student_id'] = test_results['local_student_id'].astype(str)
-    gl_mapping['local_student_id'] = gl_mapping['local_student_id'].astype(str)
 
     try:
-        test_results = pd.merge(test_results, gl_mapping, on='local_student_id', how='left')
+        grade_levels = lookup_grade_levels(test_results['local_student_id'], gl_mapping)
+        if grade_levels is None:
+            # Some students have more than one grade level, merge so their rows are duplicated per grade
+            gl_mapping['local_student_id'] = gl_mapping['local_student_id'].astype(str)
+            test_results = pd.merge(test_results, gl_mapping, on='local_student_id', how='left')
+        else:
+            test_results['grade_levels'] = grade_levels
+        # The roster stores grades as a category, the view replaces 'K' with 0 so hand them back as object
+        test_results['grade_levels'] = test_results['grade_levels'].astype(object)
     except Exception as e:
         logging.error(f'Unable to merge gl_mapping from BQ due to {e}')
     return test_results
 
 
-def add_in_unit_col(df):
-
-    # Extract 'Unit', 'Interim', or 'Module' with a number and populate the 'unit' column
-    df['unit'] = df['title'].str.extract(r'(Interim(?: Assessment)?(?: #?\d+| \d+[A-Z]*|[_ ](?:PT_)?\d+)?|Unit \d+|Final|Module \d+)', expand=False)
+#Compiled unit extraction patterns, applied once per distinct title by derive_unit
+UNIT_PATTERN = re.compile(r'(Interim(?: Assessment)?(?: #?\d+| \d+[A-Z]*|[_ ](?:PT_)?\d+)?|Unit \d+|Final|Module \d+)')
+IA_PATTERN = re.compile(rf'\b{re.escape("IA")}\b', re.IGNORECASE)
+UNIT_CLEANUP_PATTERN = re.compile(r'Assessment|#')
+WHITESPACE_PATTERN = re.compile(r'\s+')
+INTERIM_PATTERN = re.compile(r'Interim[\s_]+(?:PT_)?(\d+)')
+LESSON_PATTERN = re.compile(r'(Lesson\s+\d+)')
+CHECKPOINT_STANDARD_PATTERN = re.compile(r'Math\s+([0-9A-Za-z\.\-]+)\s+Checkpoint')
+MID_UNIT_TITLES = ('The Outsiders - Mid-Unit Novel Test', 'LOTF Mid-Novel Test')
+
+unit_col_sorting = {'Module 1':  '1',
+                    'Mid-Unit 1': '1',
+                    'Module 2' : '2',
+                    'Module 3' : '3',
+                    'Interim 1' : '4',
+                    'Interim 2': '5',
+                    'Final 1': '6',
+                    'Unit 1' : '1',
+                    'Unit 2': '2',
+                    'Unit 3' : '3'}
+
+
+def derive_unit(title):
+    """
+    Unit for a single title, following the same steps add_in_unit_col has always applied per row.
+    A title with no unit match comes out as the string 'nan', as the previous row-wise str(x) cleanup produced.
+    """
+    # Extract 'Unit', 'Interim', or 'Module' with a number
+    match = UNIT_PATTERN.search(title)
+    unit = match.group(1) if match else None
 
     #Exception for the IA title standalone, #Remove the assessment and hastag form the unit columns
-    df.loc[df['title'].str.contains(rf'\b{re.escape("IA")}\b', case=False), 'unit'] = 'Interim 1'
-    df['unit'] = df['unit'].str.replace(r'Assessment|#', '', regex=True).str.strip()
-    df['unit'] = df['unit'].str.replace(r'\s+', ' ', regex=True)
-    #Clean up the interims further from PT, underscores, random spaces
-    df['unit'] =  df['unit'].apply(lambda x: re.sub(r'Interim[\s_]+(?:PT_)?(\d+)', r'Interim \1', str(x).strip()))
+    if IA_PATTERN.search(title):
+        unit = 'Interim 1'
+    if unit is not None:
+        unit = WHITESPACE_PATTERN.sub(' ', UNIT_CLEANUP_PATTERN.sub('', unit).strip())
 
-    #single interim value in unit needs to align with others
-    df['unit'] = df['unit'].replace('Interim', 'Interim 1')
+    #Clean up the interims further from PT, underscores, random spaces
+    unit = INTERIM_PATTERN.sub(r'Interim \1', 'nan' if unit is None else unit.strip())
 
-    #might need changes eventually
-    df['unit'] = df['unit'].replace('Final', 'Final 1')
+    #single interim value in unit needs to align with others, final might need changes eventually
+    if unit == 'Interim':
+        unit = 'Interim 1'
+    elif unit == 'Final':
+        unit = 'Final 1'
 
     #manual insertion as it does not comply with the title scheme properly 9/24/26
-    df.loc[df['title'].str.contains('The Outsiders - Mid-Unit Novel Test') | df['title'].str.contains('LOTF Mid-Novel Test'), 'unit'] = 'Mid-Unit 1'
+    if any(mid_unit_title in title for mid_unit_title in MID_UNIT_TITLES):
+        unit = 'Mid-Unit 1'
 
     # For checkpoints that encode standards/lessons in the title, backfill unit only when still missing
-    missing_unit_mask = df['unit'].isna() | (df['unit'] == '')
-
     # Pattern 1: "Lesson <number>" e.g. "PLTW Algebra Advantage Checkpoint Lesson 1"
-    df.loc[missing_unit_mask, 'unit'] = df.loc[missing_unit_mask, 'title'].str.extract(
-        r'(Lesson\s+\d+)', expand=False
-    )
+    if unit == '':
+        match = LESSON_PATTERN.search(title)
+        unit = match.group(1) if match else None
 
-    # Recompute mask in case some units were just filled
-    missing_unit_mask = df['unit'].isna() | (df['unit'] == '')
+    # Pattern 2: standard code between "Math" and "Checkpoint" e.g. "Grade 6 Math 6.RP.A.3.b Checkpoint" -> "6.RP.A.3.b"
+    if unit is None or unit == '':
+        match = CHECKPOINT_STANDARD_PATTERN.search(title)
+        unit = match.group(1) if match else None
 
-    # Pattern 2: standard code between "Math" and "Checkpoint"
-    # e.g. "Grade 6 Math 6.RP.A.3.b Checkpoint" -> "6.RP.A.3.b"
-    df.loc[missing_unit_mask, 'unit'] = df.loc[missing_unit_mask, 'title'].str.extract(
-        r'Math\s+([0-9A-Za-z\.\-]+)\s+Checkpoint', expand=False
-    )
+    return np.nan if unit is None else unit
 
-    unit_col_sorting = {'Module 1':  '1',
-                        'Mid-Unit 1': '1',
-                        'Module 2' : '2',
-                        'Module 3' : '3',
-                        'Interim 1' : '4',
-                        'Interim 2': '5',
-                        'Final 1': '6',
-                        'Unit 1' : '1',
-                        'Unit 2': '2',
-                        'Unit 3' : '3'}
-    
-    df['unit_labels'] = df['unit'].map(unit_col_sorting)
-
-    # Manual overrides for specific assessments (unit-level logic)
-    df.loc[df['assessment_id'] == '161543', 'unit'] = '5.NF.1'
-    
-    return(df)
 
+def unit_table(titles):
+    """
+    Runs the unit extraction engine once per distinct title.
+
+    Returns:
+        pd.DataFrame: indexed by title, with unit, unit_labels and exit_ticket_unit columns.
+    """
+    distinct_titles = pd.unique(titles)
+    units = [derive_unit(title) for title in distinct_titles]
+    return pd.DataFrame({
+        'unit': units,
+        'unit_labels': [unit_col_sorting.get(unit, np.nan) if isinstance(unit, str) else np.nan for unit in units],
+        'exit_ticket_unit': [extract_unit(title) if 'Exit Ticket' in title else np.nan for title in distinct_titles],
+    }, index=pd.Index(distinct_titles, name='title'))
 
 
+def lookup_titles(table, titles, column):
+    # Indexed join of a per-title column back onto the rows
+    return table[column].to_numpy()[table.index.get_indexer(titles)]
 
 
+def add_in_unit_col(df):
+
+    units = unit_table(df['title'])
+    df['unit'] = lookup_titles(units, df['title'], 'unit')
+    df['unit_labels'] = lookup_titles(units, df['title'], 'unit_labels')
+    return(df)
+
 
 #Add in the Curriculum and Unit Columns via string matching from the Assessment Name
 def add_in_curriculum_col(df):
     # Ensure assessment_id is string type for consistent matching
     df['assessment_id'] = df['assessment_id'].astype(str)
-    
+
+    # Curriculum only depends on assessment_id and title, so classify each distinct pair once
+    # and join the result back onto the rows. Per-assessment fixes are applied by apply_overrides.
+    key_cols = ['assessment_id', 'title']
+    keys = classify_curriculum(df[key_cols].drop_duplicates().reset_index(drop=True))
+    df['curriculum'] = df[key_cols].merge(keys, on=key_cols, how='left')['curriculum'].to_numpy()
+
+    return df
+
+
+def classify_curriculum(df):
+    # Runs the curriculum rules over a frame of distinct (assessment_id, title) pairs
     curriculum_dict = {
         #Moreso HS mapping
         'Geometry': 'Geometry',
@@ -165,55 +210,8 @@ def add_in_curriculum_col(df):
         else:
             df.loc[df['title'].str.contains(keyword, case=False), 'curriculum'] = label
 
-    #Impossible to string match this one - assessment id 115533 (Grade 8 Interim Assessment #1)
-    df.loc[df['assessment_id'] == '115533', 'curriculum'] = 'Science'
-
-    # Interim Assessment #1 | Grade 11 | U.S. History
-    df.loc[df['assessment_id'] == '141493', 'curriculum'] = 'US History'
-
-    df.loc[df['assessment_id'] == '141492', 'curriculum'] = 'World History'
-
-    #Environmental Science Interim Assessment #1
-    df.loc[df['assessment_id'] == '141508', 'curriculum'] = 'Environmental Science'
-
-    #Algebra 1 IA #1 (Sequences + IM) 
-    df.loc[df['assessment_id'] == '141441', 'curriculum'] = 'Algebra I'
-
-    #Biology for Freshman, otherwise Anatomy
-    df.loc[(df['assessment_id'] == '141506') & (df['grade_levels'] == 9), 'curriculum'] = 'Biology'
-    df.loc[(df['assessment_id'] == '141506') & (df['grade_levels'] != 9), 'curriculum'] = 'Anatomy'
-
-    #Added in 9/24/25
-    df.loc[df['assessment_id'].isin(['142819', '143028', '161329']), 'curriculum'] = 'ELA'
-
-    # Fix specific assessment_ids with curriculum issues
-    # Math Lab assessments that were incorrectly mapped to Math
-    df.loc[df['assessment_id'].isin(['161423', '161431', '161430', '142801', '161390', '161417']), 'curriculum'] = 'Math Lab'
-    
-    # World History assessment that was incorrectly mapped to History
-    df.loc[df['assessment_id'] == '161334', 'curriculum'] = 'World History'
-    
-    # Missing curriculum assessments
-    df.loc[df['assessment_id'] == '161451', 'curriculum'] = 'US History'
-    df.loc[df['assessment_id'] == '161466', 'curriculum'] = 'Spanish I'
-    df.loc[df['assessment_id'] == '161478', 'curriculum'] = 'Anatomy'
-    df.loc[df['assessment_id'] == '161454', 'curriculum'] = 'ELA'  # APLang
-    df.loc[df['assessment_id'] == '161452', 'curriculum'] = 'Government'  # Gov
-    df.loc[df['assessment_id'] == '161450', 'curriculum'] = 'World History'  # MWH
-    df.loc[df['assessment_id'] == '161418', 'curriculum'] = 'ELA'  # Grade 12 Unit Skills Assessment
-    df.loc[df['assessment_id'] == '161456', 'curriculum'] = 'US History'  # APUSH
-    
-    # Science assessments that need specific curriculum
-    # Grade 10 Science should be Chemistry, Grade 9 Science should be Biology
-    df.loc[df['assessment_id'] == '68b22e718bbeb32951baaddf', 'curriculum'] = 'Chemistry'  # 10th Grade Science
-    df.loc[df['assessment_id'] == '161441', 'curriculum'] = 'Chemistry'  # Grade 10 Science
-    df.loc[df['assessment_id'] == '142815', 'curriculum'] = 'Biology'  # Grade 9 Science
-    df.loc[df['assessment_id'] == '161471', 'curriculum'] = 'Biology'  # Grade 9 Science
-    df.loc[df['assessment_id'] == '161556', 'curriculum'] = 'Biology'
-    
-    # Math assessments that should be Geometry or Algebra II based on grade
-    df.loc[df['assessment_id'] == '6917b5dd477a07bb7337dfe8', 'curriculum'] = 'Geometry'  # Grade 10 Math Unit 3
-    df.loc[df['assessment_id'] == '690bc60f9f7d11ef8ccd4ace', 'curriculum'] = 'Algebra II'  # Grade 11 Math Unit 3
+    # Per-assessment curriculum fixes (including the grade 9 Biology / Anatomy split for 141506)
+    # live in config/assessment_overrides.json and are applied after classification by apply_overrides
 
     # Title-based curriculum rules (current-year API only)
     # Science: use grade in title + 'Science' to infer subject
@@ -285,44 +283,11 @@ def create_test_type_column(frame):
         else 'assessment' 
     )
 
-    # Manual overrides for specific assessments (test_type-level logic)
-    frame.loc[frame['assessment_id'] == '161543', 'test_type'] = 'checkpoint'
-
     return frame
 
 def apply_manual_changes(test_results_view):
-
-    # Initialize the BigQuery client
-    client = bigquery.Client(project='icef-437920')
-
-    # Execute the query
-    changes = client.query('''
-    SELECT 
-    CAST(assessment_id AS STRING) AS assessment_id, 
-    * EXCEPT(assessment_id) 
-    FROM `icef-437920.illuminate.illuminate_checkpoint_title_issues`
-    ''')
-
-    changes = changes.result().to_dataframe()
-
-    # List of columns to update
-    columns_to_update = ['test_type', 'curriculum', 'unit', 'title']
-
-    # Function to update column based on dictionary
-    def update_column(df, column_name, update_dict):
-        try:
-            df[column_name] = df['assessment_id'].map(update_dict).fillna(df[column_name])
-            logging.info(f'{column_name} has incurred manual changes')
-        except Exception as e:
-            logging.error(f'Unable to map for column {column_name} due to {e}')
-
-
-    # Iterate through columns and apply updates
-    for column in columns_to_update:
-        update_dict = changes.set_index('assessment_id')[column].to_dict()
-        update_column(test_results_view, column, update_dict)
-
-    return test_results_view
+    # Applies illuminate_checkpoint_title_issues from BigQuery (cached locally) through the override registry
+    return apply_overrides(test_results_view, load_manual_changes())
 
 
 
@@ -339,25 +304,29 @@ def add_in_exit_ticket_info(test_results):
     #Mask for "Exit Ticket" rows
     mask = test_results["title"].str.contains("Exit Ticket", na=False)
 
-    # Update only those rows
-    test_results.loc[mask, "unit"] = test_results.loc[mask, "title"].apply(extract_unit)
+    # Update only those rows, the unit is extracted once per distinct title
+    exit_ticket_titles = test_results.loc[mask, "title"]
+    test_results.loc[mask, "unit"] = lookup_titles(unit_table(exit_ticket_titles), exit_ticket_titles, 'exit_ticket_unit')
     test_results.loc[mask, "curriculum"] = "ELA"
     test_results.loc[mask, "test_type"] = "exit ticket"
     return test_results
 
 
-def create_test_results_view(test_results):
+def create_test_results_view(test_results, years_data=None):
 
-    test_results = add_in_grade_levels(test_results) #subject to be changed to reference BQ view
-    test_results = add_in_curriculum_col(test_results)
-    test_results = add_in_unit_col(test_results)
-    test_results = create_test_type_column(test_results)
-    test_results = add_in_exit_ticket_info(test_results)
-    # test_results_view = apply_manual_changes(test_results)
+    with stage('grade_merge'):
+        test_results = add_in_grade_levels(test_results, years_data) #subject to be changed to reference BQ view
+    with stage('classification'):
+        test_results = add_in_curriculum_col(test_results)
+        test_results = add_in_unit_col(test_results)
+        test_results = create_test_type_column(test_results)
+        #Every per-assessment fix, and the BigQuery manual changes when APPLY_MANUAL_CHANGES=1, in one pass
+        test_results = apply_overrides(test_results, load_override_rules(include_manual_changes=APPLY_MANUAL_CHANGES))
+        test_results = add_in_exit_ticket_info(test_results)
 
 
     #Add in proficiency col, re-order results, and change names
-    test_results.loc[:, 'proficiency'] = test_results['performance_band_level'] + ' ' + test_results['performance_band_label'] #add in proficiency column
+    test_results.loc[:, 'proficiency'] = as_object(test_results['performance_band_level']) + ' ' + as_object(test_results['performance_band_label']) #add in proficiency column
     test_results['data_source'] = 'illuminate'
 
     test_results = test_results[['data_source', 'assessment_id', 'date_taken', 'grade_levels', 'local_student_id', 'test_type', 'curriculum', 'unit', 'unit_labels', 'title', 'standard_code', 'percent_correct', 'performance_band_level', 'performance_band_label', 'proficiency', 'mastered', '__count']]
@@ -370,7 +339,7 @@ def create_test_results_view(test_results):
     #changes occurs in place
     test_results.loc[test_results['grade'] == 'K', 'grade'] = 0
     #For safe measures
-    test_results = test_results.drop_duplicates()
+    test_results = drop_duplicate_rows(test_results, name='illuminate_assessment_results')
 
     print(test_results.columns)
 
@@ -380,6 +349,8 @@ def create_test_results_view(test_results):
     (test_results['title'].str.contains('Interim 1', case=False, na=False))
     )].reset_index(drop=True)
 
+    test_results = apply_dtype_policy(test_results, name='illuminate_assessment_results', report=True)
+
     return(test_results)
 
 
@@ -390,22 +361,11 @@ def append_prior_year(prior_year_file_path, frame, prior_year_file_name):
     # Check if prior year file exists
     if os.path.exists(prior_year_file_path):
         logging.info(f'Prior year file found at {prior_year_file_path}. Appending data.')
-        # Read the prior year file into a DataFrame
-        prior_year_frame = pd.read_csv(prior_year_file_path, encoding='ISO-8859-1')
-        
-        # Append prior year data to the current frame
-        combined_frame = pd.concat([prior_year_frame, frame], ignore_index=True)
-        
-        # Optional: Remove duplicate rows if needed
-        combined_frame = combined_frame.drop_duplicates()
+        # Typed, deduplicated prior year rows from the sidecar, only the current rows are deduplicated against them
+        prior_year_frame, prior_year_fingerprints = load_history(prior_year_file_path)
+        combined_frame = append_new_rows(prior_year_frame, prior_year_fingerprints, frame)
         logging.info(f'Prior year data appended successfully.')
 
-        # Convert the column to datetime format
-        combined_frame['date_taken'] = pd.to_datetime(combined_frame['date_taken'])
-
-        # If you want to remove the time part and keep only the date
-        combined_frame['date_taken'] = combined_frame['date_taken'].dt.date
-
     else:
         logging.warning(f'Prior year file not found at {prior_year_file_path}. Using current frame only.')
         combined_frame = frame
@@ -425,42 +385,29 @@ def send_to_local(save_path, frame, frame_name):
 
 
 
-def send_to_gcs(bucket_name, save_path, frame, frame_name):
+def send_to_gcs(bucket_name, save_path, frame, frame_name, fmt=None):
     """
-    Uploads a DataFrame as a CSV file to a GCS bucket.
+    Uploads a DataFrame to a GCS bucket, streaming it straight into the upload without a temp file.
 
     Args:
         bucket_name (str): The name of the GCS bucket.
         save_path (str): The path within the bucket where the file will be saved.
         frame (pd.DataFrame): The DataFrame to upload.
         frame_name (str): The name of the file to save.
+        fmt (str): 'csv' or 'parquet', defaults to the extension of frame_name.
+
+    Returns:
+        int: Number of bytes uploaded, 0 if the frame was empty or the upload failed.
     """
     if not frame.empty:
-        # Initialize the GCS client
-        client = storage.Client()
-
-        # Create a temporary local file to save the DataFrame
-        temp_file_path = os.path.join("/tmp", frame_name)
-        frame.to_csv(temp_file_path, index=False)
-
+        fmt = fmt or os.path.splitext(frame_name)[1].lstrip('.') or 'csv'
         try:
-            # Get the bucket
-            bucket = client.bucket(bucket_name)
-
-            # Define the blob (file path in the bucket)
-            blob = bucket.blob(os.path.join(save_path, frame_name))
-
-            # Upload the file to GCS
-            blob.upload_from_filename(temp_file_path)
-            logging.info(f"{frame_name} uploaded to GCS bucket {bucket_name} at {save_path}/{frame_name}")
+            return write_frame_to_gcs(bucket_name, os.path.join(save_path, frame_name), frame, fmt=fmt)
         except Exception as e:
             logging.error(f"Failed to upload {frame_name} to GCS bucket {bucket_name}: {e}")
-        finally:
-            # Clean up the temporary file
-            if os.path.exists(temp_file_path):
-                os.remove(temp_file_path)
     else:
         logging.info(f"No data present in {frame_name} file")
+    return 0
 
 
 
@@ -471,8 +418,10 @@ def send_to_gcs(bucket_name, save_path, frame, frame_name):
 def bring_together_test_results(test_results_no_standard, test_results_standard):
 
     df = pd.concat([test_results_standard, test_results_no_standard])
-    df['standard_code'] = df['standard_code'].fillna('percent')
-    df = df.drop_duplicates()
+    df['standard_code'] = as_object(df['standard_code']).fillna('percent')
+    df = drop_duplicate_rows(df, name='assessment_results_combined')
+    # Categories do not survive a concat of frames with different categories, so re-apply the policy
+    df = apply_dtype_policy(df, name='assessment_results_combined', report=True)
 
     return(df)
 
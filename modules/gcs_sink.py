@@ -0,0 +1,91 @@
+import io
+import logging
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from google.cloud import storage
+
+#Output format for uploaded frames, 'csv' keeps the existing file layout
+OUTPUT_FORMAT = os.getenv('OUTPUT_FORMAT', 'csv')
+UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024  # Resumable upload chunk, must be a multiple of 256 KB
+ROWS_PER_CHUNK = 100000
+
+CONTENT_TYPES = {'csv': 'text/csv', 'parquet': 'application/vnd.apache.parquet'}
+
+
+class CountingWriter(io.RawIOBase):
+    """
+    Write-only wrapper that forwards to the upload stream and counts the bytes written.
+    """
+
+    def __init__(self, stream):
+        self.stream = stream
+        self.bytes_written = 0
+
+    def writable(self):
+        return True
+
+    def write(self, data):
+        self.stream.write(data)
+        self.bytes_written += len(data)
+        return len(data)
+
+
+def parquet_safe(frame):
+    # Object columns mixing ints and strings (e.g. grade with 'K' replaced by 0) are written as strings
+    columns = {}
+    for column in frame.columns:
+        if frame[column].dtype == object and pd.api.types.infer_dtype(frame[column], skipna=True).startswith('mixed'):
+            columns[column] = frame[column].map(lambda value: value if pd.isna(value) else str(value))
+    return frame.assign(**columns) if columns else frame
+
+
+def write_parquet(frame, stream):
+    frame = parquet_safe(frame)
+    schema = pa.Schema.from_pandas(frame, preserve_index=False)
+    with pq.ParquetWriter(stream, schema, compression='zstd') as writer:
+        for start in range(0, len(frame), ROWS_PER_CHUNK):
+            chunk = frame.iloc[start:start + ROWS_PER_CHUNK]
+            writer.write_table(pa.Table.from_pandas(chunk, schema=schema, preserve_index=False))
+
+
+def write_csv(frame, stream):
+    text_stream = io.TextIOWrapper(stream, encoding='utf-8', newline='', write_through=True)
+    frame.to_csv(text_stream, index=False, chunksize=ROWS_PER_CHUNK)
+    text_stream.flush()
+    text_stream.detach()
+
+
+def frame_file_name(name, fmt=OUTPUT_FORMAT):
+    return f'{name}.{fmt}'
+
+
+def write_frame_to_gcs(bucket_name, blob_path, frame, fmt=OUTPUT_FORMAT, project_id=None):
+    """
+    Serializes frame straight into a resumable GCS upload, with no local temp file.
+
+    Args:
+        bucket_name (str): The name of the GCS bucket.
+        blob_path (str): Path of the object within the bucket.
+        frame (pd.DataFrame): The DataFrame to upload.
+        fmt (str): 'csv' or 'parquet' (zstd compressed).
+        project_id (str): Optional project for the storage client.
+
+    Returns:
+        int: Number of bytes written to the upload.
+    """
+    if fmt not in CONTENT_TYPES:
+        raise ValueError(f'Unknown output format {fmt}, expected one of {list(CONTENT_TYPES)}')
+
+    client = storage.Client(project=project_id)
+    blob = client.bucket(bucket_name).blob(blob_path)
+    with blob.open('wb', chunk_size=UPLOAD_CHUNK_SIZE, content_type=CONTENT_TYPES[fmt], ignore_flush=True) as upload:
+        counter = CountingWriter(upload)
+        if fmt == 'parquet':
+            write_parquet(frame, counter)
+        else:
+            write_csv(frame, counter)
+
+    logging.info(f'{blob_path} uploaded to GCS bucket {bucket_name}, {round(counter.bytes_written / 1024 ** 2, 2)} MB as {fmt}')
+    return counter.bytes_written
@@ -0,0 +1,116 @@
+import hashlib
+import logging
+import os
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+from .fingerprint import fingerprint, fingerprint_columns, isin_fingerprints, drop_duplicate_rows
+
+#Frozen prior-year CSVs are parsed once into a typed, deduplicated Parquet sidecar next to the CSV (or in HISTORY_CACHE_DIR)
+HISTORY_CACHE_DIR = os.getenv('HISTORY_CACHE_DIR')
+HISTORY_ENCODING = 'ISO-8859-1'
+CHECKSUM_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def sidecar_path(source_path, cache_dir=HISTORY_CACHE_DIR):
+    directory = cache_dir or os.path.dirname(source_path)
+    return os.path.join(directory, os.path.basename(source_path) + '.parquet')
+
+
+def file_checksum(path):
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(CHECKSUM_BLOCK_SIZE), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def source_fingerprint(source_path):
+    stat = os.stat(source_path)
+    return {'size': str(stat.st_size), 'mtime_ns': str(stat.st_mtime_ns)}
+
+
+def to_dates(values):
+    return pd.to_datetime(values).dt.date
+
+
+def build_sidecar(source_path, path):
+    """
+    Parses the prior-year CSV once, deduplicates it, types date_taken and writes it as Parquet with the
+    row fingerprint columns. The source size, mtime and sha256 are stored in the Parquet schema metadata.
+    """
+    frame = parse_history(source_path)
+    prints = fingerprint(frame, normalize=True)
+    frame[list(prints.columns)] = prints
+
+    metadata = {'source_sha256': file_checksum(source_path), **source_fingerprint(source_path)}
+    table = pa.Table.from_pandas(frame, preserve_index=False)
+    table = table.replace_schema_metadata({**(table.schema.metadata or {}), **{f'illuminate_{k}'.encode(): v.encode() for k, v in metadata.items()}})
+
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    pq.write_table(table, tmp_path, compression='zstd')
+    os.replace(tmp_path, path)
+    logging.info(f'Built prior-year sidecar {path} with {len(frame)} rows')
+
+
+def parse_history(source_path):
+    # Deduplicated on the raw CSV values before date_taken is typed, as append_prior_year always did,
+    # so rows whose date strings differ but parse to the same date are both kept
+    frame = pd.read_csv(source_path, encoding=HISTORY_ENCODING)
+    frame = drop_duplicate_rows(frame, normalize=True).reset_index(drop=True)
+    if 'date_taken' in frame.columns:
+        frame['date_taken'] = to_dates(frame['date_taken'])
+    return frame
+
+
+def sidecar_is_current(source_path, path):
+    # Size and mtime are checked first, the sha256 only when they moved (e.g. the file was copied in again)
+    if not os.path.exists(path):
+        return False
+    schema = pq.read_schema(path)
+    metadata = {k.decode(): v.decode() for k, v in (schema.metadata or {}).items() if k.startswith(b'illuminate_')}
+    if not metadata or not all(name in schema.names for name in fingerprint_columns()):
+        return False
+    fingerprint = source_fingerprint(source_path)
+    if all(metadata.get(f'illuminate_{k}') == v for k, v in fingerprint.items()):
+        return True
+    return metadata.get('illuminate_source_sha256') == file_checksum(source_path)
+
+
+def load_history(source_path, cache_dir=HISTORY_CACHE_DIR):
+    """
+    Returns the prior-year frame and its row fingerprints, from the sidecar when it matches the source file.
+
+    Returns:
+        tuple: (frame, fingerprints)
+    """
+    path = sidecar_path(source_path, cache_dir)
+    try:
+        if not sidecar_is_current(source_path, path):
+            build_sidecar(source_path, path)
+        table = pq.read_table(path, memory_map=True)
+    except OSError as e:
+        logging.warning(f'Prior-year sidecar unavailable at {path} due to {e}, parsing {source_path} directly')
+        frame = parse_history(source_path)
+        return frame, fingerprint(frame, normalize=True)
+
+    names = fingerprint_columns()
+    prints = pd.DataFrame({name: table.column(name).to_numpy() for name in names})
+    frame = table.drop_columns(names).to_pandas()
+    logging.info(f'Loaded {len(frame)} prior-year rows from sidecar {path}')
+    return frame, prints
+
+
+def append_new_rows(history, history_prints, frame):
+    """
+    Appends the rows of frame that are not already in history. Only the new rows are deduplicated;
+    rows are compared on the history columns.
+    """
+    frame = frame.copy()
+    if 'date_taken' in frame.columns:
+        frame['date_taken'] = to_dates(frame['date_taken'])
+    prints = fingerprint(frame, list(history.columns), normalize=True)
+    keep = ~prints.duplicated().to_numpy() & ~isin_fingerprints(prints, history_prints)
+    logging.info(f'{int(keep.sum())} of {len(frame)} current rows are new against {len(history)} prior-year rows')
+    return pd.concat([history, frame[keep]], ignore_index=True)
@@ -0,0 +1,146 @@
+import hashlib
+import logging
+import os
+import threading
+import time
+from urllib.parse import urlsplit, parse_qsl
+
+CACHE_MODES = ('off', 'on', 'replay')
+#Once over its size cap the cache is trimmed to this fraction of it, so puts near the cap don't each rescan the directory
+EVICT_LOW_WATER = 0.9
+
+
+class CacheMissError(LookupError):
+    """Raised in replay mode when a request has no cached response."""
+
+
+def cache_key(url_ext):
+    """
+    Content address for a request, built from the endpoint and its sorted query args (page included),
+    so the same request always maps to the same file regardless of argument order.
+    """
+    parts = urlsplit(url_ext)
+    endpoint = parts.path.strip('/')
+    args = sorted(parse_qsl(parts.query, keep_blank_values=True))
+    canonical = endpoint + '?' + '&'.join(f'{k}={v}' for k, v in args)
+    return hashlib.sha256(canonical.encode('utf-8')).hexdigest()
+
+
+class ResponseCache:
+    """
+    On-disk cache of successful Illuminate response bodies.
+
+    Args:
+        cache_dir (str): Directory holding the cached bodies.
+        ttl_seconds (int): Entries older than this are treated as missing and evicted.
+        max_bytes (int): Size cap, oldest entries are evicted first once exceeded, down to EVICT_LOW_WATER of the cap.
+        mode (str): 'on' reads and writes the cache, 'replay' serves only from cache
+            (ignoring TTL) and raises CacheMissError on a miss, 'off' disables it.
+    """
+
+    def __init__(self, cache_dir, ttl_seconds=24 * 3600, max_bytes=2 * 1024 ** 3, mode='on'):
+        if mode not in CACHE_MODES:
+            raise ValueError(f'Unknown cache mode {mode}, expected one of {CACHE_MODES}')
+        self.cache_dir = cache_dir
+        self.ttl_seconds = ttl_seconds
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._size = sum(size for _, _, size in self._entries())
+        if mode == 'on':
+            self.evict()
+        logging.info(f'Response cache at {cache_dir} in {mode} mode, {round(self._size / 1024 ** 2, 1)} MB on disk')
+
+    @property
+    def enabled(self):
+        return self.mode != 'off'
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key)
+
+    def _entries(self):
+        # Yields (path, mtime, size) for every cached body
+        for root, _, files in os.walk(self.cache_dir):
+            for name in files:
+                if name.endswith('.tmp'):
+                    continue
+                path = os.path.join(root, name)
+                try:
+                    stat = os.stat(path)
+                except FileNotFoundError:
+                    continue
+                yield path, stat.st_mtime, stat.st_size
+
+    def get(self, url_ext):
+        path = self._path(cache_key(url_ext))
+        try:
+            age = time.time() - os.path.getmtime(path)
+            if self.mode != 'replay' and age > self.ttl_seconds:
+                raise FileNotFoundError(path)
+            with open(path, 'rb') as f:
+                content = f.read()
+            self.hits += 1
+            return content
+        except FileNotFoundError:
+            self.misses += 1
+            if self.mode == 'replay':
+                raise CacheMissError(f'No cached response for {url_ext}')
+            return None
+
+    def put(self, url_ext, content):
+        if self.mode != 'on':
+            return
+        path = self._path(cache_key(url_ext))
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        tmp_path = f'{path}.{threading.get_ident()}.tmp'
+        with open(tmp_path, 'wb') as f:
+            f.write(content)
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._size += len(content)
+            over_cap = self._size > self.max_bytes
+        if over_cap:
+            self.evict(only_over_cap=True)
+
+    def evict(self, only_over_cap=False):
+        # Drop expired entries first, then the oldest entries until the cache is back under its low-water mark
+        with self._lock:
+            if only_over_cap and self._size <= self.max_bytes:
+                # Another put already trimmed the cache
+                return
+            now = time.time()
+            entries = sorted(self._entries(), key=lambda entry: entry[1])
+            total = sum(size for _, _, size in entries)
+            target = self.max_bytes * EVICT_LOW_WATER if total > self.max_bytes else self.max_bytes
+            removed = 0
+            for path, mtime, size in entries:
+                if now - mtime <= self.ttl_seconds and total <= target:
+                    continue
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+                total -= size
+                removed += 1
+            self._size = total
+        if removed:
+            logging.info(f'Evicted {removed} cached responses, cache is now {round(total / 1024 ** 2, 1)} MB')
+
+
+def response_cache_from_env():
+    """
+    Builds the cache from HTTP_CACHE_MODE, HTTP_CACHE_DIR, HTTP_CACHE_TTL_HOURS and HTTP_CACHE_MAX_MB.
+    Returns None when HTTP_CACHE_MODE is unset or 'off'.
+    """
+    mode = os.getenv('HTTP_CACHE_MODE', 'off')
+    if mode == 'off':
+        return None
+    return ResponseCache(
+        cache_dir=os.getenv('HTTP_CACHE_DIR', '/tmp/illuminate_http_cache'),
+        ttl_seconds=float(os.getenv('HTTP_CACHE_TTL_HOURS', 24)) * 3600,
+        max_bytes=int(os.getenv('HTTP_CACHE_MAX_MB', 2048)) * 1024 ** 2,
+        mode=mode
+    )
@@ -0,0 +1,116 @@
+import json
+import logging
+import os
+import time
+import pandas as pd
+from .dtypes import as_object
+
+#Columns an override rule can set. A blank value in a rule leaves the derived value untouched.
+OVERRIDE_COLUMNS = ['curriculum', 'unit', 'test_type', 'title']
+
+DEFAULT_OVERRIDES_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), 'config', 'assessment_overrides.json')
+MANUAL_CHANGES_CACHE_PATH = os.getenv('MANUAL_CHANGES_CACHE_PATH', '/tmp/illuminate_checkpoint_title_issues.parquet')
+MANUAL_CHANGES_CACHE_TTL_HOURS = float(os.getenv('MANUAL_CHANGES_CACHE_TTL_HOURS', 24))
+
+MANUAL_CHANGES_QUERY = '''
+    SELECT
+    CAST(assessment_id AS STRING) AS assessment_id,
+    * EXCEPT(assessment_id)
+    FROM `icef-437920.illuminate.illuminate_checkpoint_title_issues`
+    '''
+
+
+def normalize_rules(rules):
+    # One row per rule with string assessment_id, string grade ('' = every grade) and the override columns
+    rules = rules.copy()
+    rules['assessment_id'] = rules['assessment_id'].astype(str)
+    if 'grade' not in rules.columns:
+        rules['grade'] = ''
+    rules['grade'] = grade_keys(rules['grade']).replace('nan', '')
+    for column in OVERRIDE_COLUMNS:
+        if column not in rules.columns:
+            rules[column] = pd.NA
+        rules[column] = rules[column].where(rules[column].notna() & (rules[column].astype(str) != ''))
+    return rules[['assessment_id', 'grade'] + OVERRIDE_COLUMNS]
+
+
+def grade_keys(grades):
+    # Grades arrive as ints, floats or strings such as 'K'; compare them as '9', 'K', ... and every missing grade as 'nan'
+    # (astype(str) keeps missing values missing in pandas' str dtype, so they are filled first)
+    return grades.astype(object).where(grades.notna(), 'nan').astype(str).str.replace(r'\.0$', '', regex=True)
+
+
+def load_local_rules(path=DEFAULT_OVERRIDES_PATH):
+    with open(path) as f:
+        rules = pd.DataFrame(json.load(f))
+    logging.info(f'Loaded {len(rules)} assessment override rules from {path}')
+    return normalize_rules(rules)
+
+
+def load_manual_changes(cache_path=MANUAL_CHANGES_CACHE_PATH, ttl_hours=MANUAL_CHANGES_CACHE_TTL_HOURS):
+    """
+    Reads illuminate_checkpoint_title_issues from BigQuery, reusing a local copy younger than ttl_hours.
+    """
+    if os.path.exists(cache_path) and time.time() - os.path.getmtime(cache_path) < ttl_hours * 3600:
+        logging.info(f'Using cached manual changes from {cache_path}')
+        return normalize_rules(pd.read_parquet(cache_path))
+
+    from google.cloud import bigquery
+    client = bigquery.Client(project='icef-437920')
+    changes = client.query(MANUAL_CHANGES_QUERY).result().to_dataframe()
+    try:
+        changes.to_parquet(cache_path, index=False)
+    except Exception as e:
+        logging.warning(f'Unable to cache manual changes to {cache_path} due to {e}')
+    logging.info(f'Loaded {len(changes)} manual changes from BigQuery')
+    return normalize_rules(changes)
+
+
+def load_override_rules(path=DEFAULT_OVERRIDES_PATH, include_manual_changes=False):
+    """
+    Returns the override registry. Manual changes from BigQuery are applied after, and take precedence over, the local rules.
+    """
+    rules = [load_local_rules(path)]
+    if include_manual_changes:
+        rules.append(load_manual_changes())
+    return pd.concat(rules, ignore_index=True)
+
+
+def apply_overrides(df, rules, grade_column='grade_levels'):
+    """
+    Applies every override rule in one indexed pass. Rules are matched on assessment_id, and a rule with a
+    grade only applies to rows of that grade and wins over the assessment's grade-less rule. For rules that
+    share a key, the last one wins.
+    """
+    if rules.empty or df.empty:
+        return df
+
+    ids = df['assessment_id'].astype(str)
+    hit = ids.isin(set(rules['assessment_id']))
+    if not hit.any():
+        return df
+
+    generic = rules[rules['grade'] == ''].drop_duplicates('assessment_id', keep='last').set_index('assessment_id')
+    specific = rules[rules['grade'] != ''].drop_duplicates(['assessment_id', 'grade'], keep='last').set_index(['assessment_id', 'grade'])
+
+    hit_ids = ids[hit]
+    if grade_column in df.columns:
+        hit_grades = grade_keys(df.loc[hit, grade_column])
+    else:
+        hit_grades = pd.Series('nan', index=hit_ids.index)
+    specific_key = pd.MultiIndex.from_arrays([hit_ids.to_numpy(), hit_grades.to_numpy()])
+
+    generic_values = generic[OVERRIDE_COLUMNS].reindex(hit_ids.to_numpy())
+    specific_values = specific[OVERRIDE_COLUMNS].reindex(specific_key)
+    generic_values.index = specific_values.index = hit_ids.index
+    values = specific_values.combine_first(generic_values)
+
+    for column in OVERRIDE_COLUMNS:
+        if column not in df.columns:
+            continue
+        column_values = values[column]
+        if column_values.notna().any():
+            df[column] = as_object(df[column])
+            df.loc[hit, column] = column_values.where(column_values.notna(), df.loc[hit, column])
+            logging.info(f'{column} has incurred overrides for {int(column_values.notna().sum())} rows')
+    return df
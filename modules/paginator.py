@@ -0,0 +1,64 @@
+import asyncio
+import logging
+import os
+import threading
+from concurrent.futures import ThreadPoolExecutor
+
+#Pages 2..N of an endpoint are fetched on their own pool so the assessment-level pool never waits on itself
+PAGE_FANOUT_WORKERS = int(os.getenv('PAGE_FANOUT_WORKERS', 16))
+
+_page_executor = None
+_page_executor_lock = threading.Lock()
+
+
+def get_page_executor():
+    global _page_executor
+    if _page_executor is None:
+        with _page_executor_lock:
+            if _page_executor is None:
+                _page_executor = ThreadPoolExecutor(max_workers=PAGE_FANOUT_WORKERS, thread_name_prefix='illuminate-page')
+    return _page_executor
+
+
+def remaining_pages(first_page):
+    # Returns the page numbers still to fetch once page 1 has come back
+    status_code, results = first_page
+    if status_code != 200 or not isinstance(results, dict):
+        return []
+    if results.get('num_results') == 0:
+        return []
+    return list(range(2, int(results.get('num_pages', 1) or 1) + 1))
+
+
+def fetch_pages(fetch_page):
+    """
+    Fetches page 1, then fans pages 2..num_pages out concurrently.
+
+    Args:
+        fetch_page (callable): fetch_page(page) -> (status_code, parsed results dict or None).
+
+    Returns:
+        list: (status_code, results) tuples in page order, starting with page 1.
+    """
+    first_page = fetch_page(1)
+    pages = remaining_pages(first_page)
+    if not pages:
+        return [first_page]
+
+    logging.debug(f'Fanning out pages 2-{pages[-1]}')
+    executor = get_page_executor()
+    futures = [executor.submit(fetch_page, page) for page in pages]
+    return [first_page] + [future.result() for future in futures]
+
+
+async def fetch_pages_async(fetch_page):
+    """
+    Asyncio counterpart of fetch_pages. fetch_page is a coroutine function with the same contract.
+    """
+    first_page = await fetch_page(1)
+    pages = remaining_pages(first_page)
+    if not pages:
+        return [first_page]
+
+    logging.debug(f'Fanning out pages 2-{pages[-1]}')
+    return [first_page] + list(await asyncio.gather(*(fetch_page(page) for page in pages)))
@@ -0,0 +1,135 @@
+import json
+import logging
+from datetime import datetime
+from google.cloud import storage
+
+#CSV encodings: the frozen prior-year files are ISO-8859-1, partitions written by gcs_sink are UTF-8
+FROZEN_CSV_ENCODING = 'ISO-8859-1'
+OUTPUT_CSV_ENCODING = 'UTF-8'
+
+#Frozen prior-year files. These are referenced from each table's manifest, never re-read or rewritten.
+PRIOR_YEAR_PARTITIONS = {
+    'assessment_results_group': {
+        '23-24': 'gs://historicalbucket-icefschools-1/illuminate/assessment_results_group_23-24.csv',
+        '24-25': 'gs://historicalbucket-icefschools-1/illuminate/assessment_results_group_24-25.csv',
+    },
+    'assessment_results_combined': {
+        '23-24': 'gs://historicalbucket-icefschools-1/illuminate/assessment_results_combined_23-24.csv',
+        '24-25': 'gs://historicalbucket-icefschools-1/illuminate/assessment_results_combined_24-25.csv',
+    },
+    'illuminate_assessment_results': {
+        '23-24': 'gs://historicalbucket-icefschools-1/illuminate/illuminate_assessment_results_23-24.csv',
+        '24-25': 'gs://historicalbucket-icefschools-1/illuminate/illuminate_assessment_results_24-25.csv',
+    },
+}
+
+
+def partition_blob_path(table_name, years_data, fmt):
+    return f'{table_name}/year={years_data}/{table_name}.{fmt}'
+
+
+def uri_format(uri):
+    return uri.rsplit('.', 1)[-1].lower()
+
+
+def partition_encoding(partition):
+    # Manifests saved before encodings were recorded only tell frozen and written partitions apart
+    if partition['format'] != 'csv':
+        return None
+    return partition.get('encoding') or (FROZEN_CSV_ENCODING if partition.get('frozen') else OUTPUT_CSV_ENCODING)
+
+
+def external_table_suffix(fmt, encoding):
+    # e.g. csv_utf8, csv_iso88591, parquet
+    return fmt if encoding is None else f"{fmt}_{encoding.lower().replace('-', '')}"
+
+
+class PartitionManifest:
+    """
+    Manifest of the year partitions that make up one logical table, stored at {table_name}/_manifest.json.
+
+    Each partition records its URI, format and CSV encoding, and for partitions written by this pipeline the
+    row count, bytes and update time. Prior-year partitions are registered by URI only.
+    """
+
+    def __init__(self, bucket_name, table_name, project_id=None):
+        self.bucket_name = bucket_name
+        self.table_name = table_name
+        self.blob = storage.Client(project=project_id).bucket(bucket_name).blob(f'{table_name}/_manifest.json')
+        self.partitions = {}
+        if self.blob.exists():
+            self.partitions = json.loads(self.blob.download_as_bytes()).get('partitions', {})
+        for years_data, uri in PRIOR_YEAR_PARTITIONS.get(table_name, {}).items():
+            fmt = uri_format(uri)
+            self.partitions.setdefault(years_data, {'uri': uri, 'format': fmt, 'encoding': FROZEN_CSV_ENCODING if fmt == 'csv' else None, 'frozen': True})
+
+    def set_partition(self, years_data, fmt, rows, bytes_written):
+        self.partitions[years_data] = {
+            'uri': f'gs://{self.bucket_name}/{partition_blob_path(self.table_name, years_data, fmt)}',
+            'format': fmt,
+            'encoding': OUTPUT_CSV_ENCODING if fmt == 'csv' else None,
+            'rows': rows,
+            'bytes': bytes_written,
+            'updated': datetime.now().isoformat(),
+        }
+
+    def save(self):
+        payload = {'table': self.table_name, 'partitions': dict(sorted(self.partitions.items()))}
+        self.blob.upload_from_string(json.dumps(payload, indent=2), content_type='application/json')
+        logging.info(f'Saved manifest for {self.table_name} with partitions {sorted(self.partitions)}')
+
+
+def create_external_table(client, table_id, fmt, uris, encoding=OUTPUT_CSV_ENCODING):
+    """
+    (Re)creates a BigQuery external table over uris, so its sources always match what was last uploaded.
+
+    Returns:
+        dict: column name -> BigQuery type, as autodetected.
+    """
+    from google.cloud import bigquery
+    config = bigquery.ExternalConfig('CSV' if fmt == 'csv' else 'PARQUET')
+    config.source_uris = sorted(uris)
+    config.autodetect = True
+    if fmt == 'csv':
+        config.options.skip_leading_rows = 1
+        config.options.allow_quoted_newlines = True
+        config.options.encoding = encoding
+    table = bigquery.Table(table_id)
+    table.external_data_configuration = config
+    client.delete_table(table_id, not_found_ok=True)
+    client.create_table(table)
+    return {field.name: field.field_type for field in client.get_table(table_id).schema}
+
+
+def publish_logical_table(manifest, project_id, dataset_id):
+    """
+    Exposes every partition in the manifest as one view, {table_name}_all_years.
+
+    Partitions are grouped by format and CSV encoding into external tables over their URIs, so UTF-8 partitions
+    are never read as ISO-8859-1. The view unions the columns those tables share, casting a column to STRING
+    where the tables disagree on its type.
+    """
+    from google.cloud import bigquery
+    client = bigquery.Client(project=project_id)
+
+    uris_by_source = {}
+    for partition in manifest.partitions.values():
+        uris_by_source.setdefault((partition['format'], partition_encoding(partition)), []).append(partition['uri'])
+
+    schemas = {}
+    for (fmt, encoding), uris in uris_by_source.items():
+        external_table_id = f'{project_id}.{dataset_id}.{manifest.table_name}_{external_table_suffix(fmt, encoding)}_partitions'
+        schemas[external_table_id] = create_external_table(client, external_table_id, fmt, uris, encoding)
+
+    common = [name for name in next(iter(schemas.values())) if all(name in schema for schema in schemas.values())]
+    selects = []
+    for external_table_id, schema in schemas.items():
+        columns = []
+        for name in common:
+            types = {s[name] for s in schemas.values()}
+            columns.append(f'`{name}`' if len(types) == 1 else f'CAST(`{name}` AS STRING) AS `{name}`')
+        selects.append(f'SELECT {", ".join(columns)} FROM `{external_table_id}`')
+
+    view_sql = f'CREATE OR REPLACE VIEW `{project_id}.{dataset_id}.{manifest.table_name}_all_years` AS\n' + '\nUNION ALL\n'.join(selects)
+    client.query(view_sql).result()
+    logging.info(f'Published {manifest.table_name}_all_years over {sum(len(u) for u in uris_by_source.values())} partitions')
@@ -0,0 +1,156 @@
+import cProfile
+import io
+import logging
+import os
+import pstats
+import re
+import sys
+import threading
+import tracemalloc
+from collections import Counter
+from datetime import datetime
+
+#PIPELINE_PROFILE turns on per-stage profiling without code changes:
+#  cprofile  - deterministic profile of the stage's own thread (.prof and a cumulative-time report)
+#  sampling  - wall-clock stack samples of every thread, written as collapsed stacks for flame graphs
+#  both      - both of the above
+#tracemalloc top allocations are recorded alongside unless PIPELINE_PROFILE_TRACEMALLOC=0.
+PIPELINE_PROFILE = os.getenv('PIPELINE_PROFILE', '').lower()
+PIPELINE_PROFILE_DIR = os.getenv('PIPELINE_PROFILE_DIR', '/tmp/illuminate_profiles')
+PIPELINE_PROFILE_INTERVAL_MS = float(os.getenv('PIPELINE_PROFILE_INTERVAL_MS', 5))
+PIPELINE_PROFILE_TRACEMALLOC = os.getenv('PIPELINE_PROFILE_TRACEMALLOC', '1') == '1'
+PIPELINE_PROFILE_TRACE_FRAMES = int(os.getenv('PIPELINE_PROFILE_TRACE_FRAMES', 1))
+TOP_ENTRIES = 40
+
+PROFILE_MODES = ('cprofile', 'sampling', 'both')
+IGNORED_THREADS = ('illuminate-profile-sampler', 'illuminate-rss-sampler')
+WORKER_SUFFIX = re.compile(r'[_-]\d+$')
+
+RUN_ID = datetime.now().strftime('%Y%m%dT%H%M%S')
+_cprofile_active = threading.Lock()
+
+
+class SamplingProfiler:
+    """
+    Samples the stack of every thread at a fixed interval. Worker threads of one pool are folded together
+    (ThreadPoolExecutor-0_3 -> ThreadPoolExecutor-0), so the output reads per pool rather than per thread.
+    """
+
+    def __init__(self, interval_ms=PIPELINE_PROFILE_INTERVAL_MS):
+        self.interval = interval_ms / 1000
+        self.counts = Counter()
+        self.samples = 0
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='illuminate-profile-sampler', daemon=True)
+
+    def start(self):
+        self._thread.start()
+
+    def stop(self):
+        self._stop.set()
+        self._thread.join()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            names = {thread.ident: thread.name for thread in threading.enumerate()}
+            for ident, frame in sys._current_frames().items():
+                name = names.get(ident, str(ident))
+                if name in IGNORED_THREADS:
+                    continue
+                stack = []
+                while frame is not None:
+                    code = frame.f_code
+                    stack.append(f'{code.co_name} ({os.path.basename(code.co_filename)}:{code.co_firstlineno})')
+                    frame = frame.f_back
+                self.counts[';'.join([WORKER_SUFFIX.sub('', name)] + stack[::-1])] += 1
+            self.samples += 1
+
+    def collapsed(self):
+        # Brendan Gregg's folded format, readable by flamegraph.pl, speedscope and inferno
+        return ''.join(f'{stack} {count}\n' for stack, count in self.counts.most_common())
+
+
+class StageProfiler:
+    """
+    Profiles one pipeline stage and writes its reports to {directory}/{run_id}/ when stopped:
+        {stage}.prof            cProfile stats, for snakeviz / pstats
+        {stage}.cumulative.txt  top functions by cumulative time
+        {stage}.folded          collapsed stacks for a flame graph
+        {stage}.alloc.txt       peak traced memory and top allocation sites
+    """
+
+    def __init__(self, stage, mode=PIPELINE_PROFILE, directory=PIPELINE_PROFILE_DIR, trace_allocations=PIPELINE_PROFILE_TRACEMALLOC):
+        self.stage = re.sub(r'[^A-Za-z0-9_.-]', '_', stage)
+        self.directory = os.path.join(directory, RUN_ID)
+        self.cprofile = None
+        self.sampler = None
+        self.trace_allocations = trace_allocations and not tracemalloc.is_tracing()
+
+        # Only one cProfile can be active at a time, a nested stage falls back to sampling
+        if mode in ('cprofile', 'both') and _cprofile_active.acquire(blocking=False):
+            self.cprofile = cProfile.Profile()
+        if mode in ('sampling', 'both') or (mode == 'cprofile' and self.cprofile is None):
+            self.sampler = SamplingProfiler()
+
+    def start(self):
+        if self.trace_allocations:
+            tracemalloc.start(PIPELINE_PROFILE_TRACE_FRAMES)
+        if self.sampler is not None:
+            self.sampler.start()
+        if self.cprofile is not None:
+            self.cprofile.enable()
+        return self
+
+    def stop(self):
+        if self.cprofile is not None:
+            self.cprofile.disable()
+            _cprofile_active.release()
+        if self.sampler is not None:
+            self.sampler.stop()
+        snapshot = peak = None
+        if self.trace_allocations:
+            snapshot = tracemalloc.take_snapshot()
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+
+        try:
+            self.write(snapshot, peak)
+        except OSError as e:
+            logging.warning(f'Unable to write profile for stage {self.stage} to {self.directory} due to {e}')
+
+    def path(self, suffix):
+        return os.path.join(self.directory, f'{self.stage}{suffix}')
+
+    def write(self, snapshot, peak):
+        os.makedirs(self.directory, exist_ok=True)
+        if self.cprofile is not None:
+            self.cprofile.dump_stats(self.path('.prof'))
+            report = io.StringIO()
+            pstats.Stats(self.cprofile, stream=report).sort_stats('cumulative').print_stats(TOP_ENTRIES)
+            with open(self.path('.cumulative.txt'), 'w') as f:
+                f.write(report.getvalue())
+        if self.sampler is not None:
+            with open(self.path('.folded'), 'w') as f:
+                f.write(self.sampler.collapsed())
+        if snapshot is not None:
+            snapshot = snapshot.filter_traces([tracemalloc.Filter(False, tracemalloc.__file__), tracemalloc.Filter(False, __file__)])
+            lines = [f'Peak traced memory: {round(peak / 1024 ** 2, 1)} MB', f'Top {TOP_ENTRIES} allocation sites still held at the end of the stage:']
+            key = 'traceback' if PIPELINE_PROFILE_TRACE_FRAMES > 1 else 'lineno'
+            for stat in snapshot.statistics(key)[:TOP_ENTRIES]:
+                lines.append(str(stat))
+                if key == 'traceback':
+                    lines.extend(f'    {line}' for line in stat.traceback.format())
+            with open(self.path('.alloc.txt'), 'w') as f:
+                f.write('\n'.join(lines) + '\n')
+        samples = f', {self.sampler.samples} samples' if self.sampler is not None else ''
+        logging.info(f'Profile for stage {self.stage} written to {self.directory}{samples}')
+
+
+def stage_profiler(stage):
+    # Started profiler for stage when PIPELINE_PROFILE is set, otherwise None
+    if not PIPELINE_PROFILE:
+        return None
+    if PIPELINE_PROFILE not in PROFILE_MODES:
+        logging.warning(f'Unknown PIPELINE_PROFILE {PIPELINE_PROFILE}, expected one of {PROFILE_MODES}')
+        return None
+    return StageProfiler(stage).start()
@@ -0,0 +1,180 @@
+import asyncio
+import collections
+import logging
+import os
+import random
+import threading
+import time
+from datetime import datetime, timezone
+from email.utils import parsedate_to_datetime
+
+#Status codes that mean the server is overloaded or briefly unavailable, these are retried
+RETRY_STATUS_CODES = {429, 500, 502, 503, 504}
+
+
+def parse_retry_after(value):
+    # Retry-After is either a number of seconds or an HTTP date. Returns seconds, or None if absent/unparseable
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        retry_at = parsedate_to_datetime(value)
+    except (TypeError, ValueError):
+        return None
+    if retry_at.tzinfo is None:
+        retry_at = retry_at.replace(tzinfo=timezone.utc)
+    return max(0.0, (retry_at - datetime.now(timezone.utc)).total_seconds())
+
+
+class AdaptiveLimiter:
+    """
+    AIMD concurrency limiter shared by every Illuminate request.
+
+    The limit grows by roughly one slot per window of successful requests while at least half of it is in use,
+    and is cut multiplicatively on a 429/5xx or a connection error. Latency is not treated as congestion: page
+    latency varies with the rows returned (an empty result is far faster than a full page), so it says little
+    about server load.
+    Requests that fail with a retryable status or connection error are retried with jittered exponential
+    backoff, honouring Retry-After when the server sends it.
+    """
+
+    def __init__(self, initial_limit=16, min_limit=2, max_limit=256, decrease_factor=0.7,
+                 max_retries=5, backoff_base=1.0, backoff_cap=60.0):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.decrease_factor = decrease_factor
+        self.max_retries = max_retries
+        self.backoff_base = backoff_base
+        self.backoff_cap = backoff_cap
+        self.in_flight = 0
+        self.retries = 0
+        self._latency_ewma = None
+        self._last_decrease = 0.0
+        self._condition = threading.Condition()
+        self._async_waiters = collections.deque()
+
+    def _has_slot(self):
+        return self.in_flight < max(self.min_limit, int(self.limit))
+
+    def acquire(self):
+        with self._condition:
+            while not self._has_slot():
+                self._condition.wait()
+            self.in_flight += 1
+
+    async def acquire_async(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            with self._condition:
+                if self._has_slot():
+                    self.in_flight += 1
+                    return
+                waiter = loop.create_future()
+                self._async_waiters.append((loop, waiter))
+            await waiter
+
+    def release(self, status_code, latency):
+        with self._condition:
+            self.in_flight -= 1
+            self._adjust(status_code, latency)
+            self._condition.notify_all()
+            waiters, self._async_waiters = self._async_waiters, collections.deque()
+        for loop, waiter in waiters:
+            loop.call_soon_threadsafe(lambda w=waiter: w.done() or w.set_result(None))
+
+    def _adjust(self, status_code, latency):
+        # Called with the condition held
+        congested = status_code is None or status_code in RETRY_STATUS_CODES
+        if not congested and latency is not None:
+            self._latency_ewma = latency if self._latency_ewma is None else 0.8 * self._latency_ewma + 0.2 * latency
+
+        if congested:
+            # Decrease at most once per smoothed round trip so one burst of errors does not collapse the limit
+            now = time.monotonic()
+            if now - self._last_decrease > (self._latency_ewma or 1.0):
+                self.limit = max(self.min_limit, self.limit * self.decrease_factor)
+                self._last_decrease = now
+                logging.info(f'Adaptive limiter decreased concurrency to {int(self.limit)} (status {status_code})')
+        elif 2 * (self.in_flight + 1) >= self.limit:
+            # Only grow while the limit is what bounds concurrency, an idle limit would otherwise climb unchecked
+            self.limit = min(self.max_limit, self.limit + 1.0 / max(self.limit, 1.0))
+
+    def backoff_delay(self, attempt, retry_after=None):
+        retry_after = parse_retry_after(retry_after)
+        if retry_after is not None:
+            return min(retry_after, self.backoff_cap)
+        # Full jitter
+        return random.uniform(0, min(self.backoff_cap, self.backoff_base * (2 ** attempt)))
+
+    def call(self, send, retry_exceptions=()):
+        """
+        Runs send() -> (status_code, headers, content) under the limiter, retrying retryable failures.
+        Returns the last (status_code, headers, content); re-raises the last exception if every attempt raised.
+        """
+        for attempt in range(self.max_retries + 1):
+            self.acquire()
+            start = time.monotonic()
+            try:
+                status_code, headers, content = send()
+            except retry_exceptions as e:
+                self.release(None, None)
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                logging.warning(f'Request failed with {e}, retrying in {round(delay, 2)}s (attempt {attempt + 1})')
+                self._count_retry()
+                time.sleep(delay)
+                continue
+            self.release(status_code, time.monotonic() - start)
+
+            if status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                return status_code, headers, content
+            delay = self.backoff_delay(attempt, headers.get('Retry-After') if headers else None)
+            logging.warning(f'Received {status_code}, retrying in {round(delay, 2)}s (attempt {attempt + 1})')
+            self._count_retry()
+            time.sleep(delay)
+
+    async def call_async(self, send, retry_exceptions=()):
+        # Asyncio counterpart of call, send is a coroutine function
+        for attempt in range(self.max_retries + 1):
+            await self.acquire_async()
+            start = time.monotonic()
+            try:
+                status_code, headers, content = await send()
+            except retry_exceptions as e:
+                self.release(None, None)
+                if attempt == self.max_retries:
+                    raise
+                delay = self.backoff_delay(attempt)
+                logging.warning(f'Request failed with {e!r}, retrying in {round(delay, 2)}s (attempt {attempt + 1})')
+                self._count_retry()
+                await asyncio.sleep(delay)
+                continue
+            self.release(status_code, time.monotonic() - start)
+
+            if status_code not in RETRY_STATUS_CODES or attempt == self.max_retries:
+                return status_code, headers, content
+            delay = self.backoff_delay(attempt, headers.get('Retry-After') if headers else None)
+            logging.warning(f'Received {status_code}, retrying in {round(delay, 2)}s (attempt {attempt + 1})')
+            self._count_retry()
+            await asyncio.sleep(delay)
+
+    def _count_retry(self):
+        with self._condition:
+            self.retries += 1
+
+
+def rate_limiter_from_env():
+    """
+    Builds the limiter from RATE_INITIAL_CONCURRENCY, RATE_MIN_CONCURRENCY, RATE_MAX_CONCURRENCY and RATE_MAX_RETRIES.
+    """
+    return AdaptiveLimiter(
+        initial_limit=int(os.getenv('RATE_INITIAL_CONCURRENCY', 16)),
+        min_limit=int(os.getenv('RATE_MIN_CONCURRENCY', 2)),
+        max_limit=int(os.getenv('RATE_MAX_CONCURRENCY', 256)),
+        max_retries=int(os.getenv('RATE_MAX_RETRIES', 5))
+    )
@@ -0,0 +1,90 @@
+import logging
+import os
+import time
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+#Local roster cache, one compact Parquet file per school year
+ROSTER_CACHE_DIR = os.getenv('ROSTER_CACHE_DIR', '/tmp/illuminate_roster_cache')
+ROSTER_CACHE_MAX_AGE_HOURS = float(os.getenv('ROSTER_CACHE_MAX_AGE_HOURS', 12))
+
+ROSTER_QUERY = '''
+    SELECT DISTINCT
+    student_number AS local_student_id,
+    grade_level AS grade_levels
+    FROM `icef-437920.views.student_to_teacher`
+    WHERE year = @year
+    '''
+
+
+def roster_cache_path(years_data, cache_dir=ROSTER_CACHE_DIR):
+    return os.path.join(cache_dir, f'student_grade_levels_{years_data}.parquet')
+
+
+def fetch_roster(years_data):
+    # Pulls the roster through the BigQuery Storage read API straight into Arrow
+    from google.cloud import bigquery
+    client = bigquery.Client(project='icef-437920')
+    job_config = bigquery.QueryJobConfig(
+        query_parameters=[bigquery.ScalarQueryParameter('year', 'STRING', years_data)]
+    )
+    logging.info(f'Executing BigQuery: {ROSTER_QUERY} with year={years_data}')
+    return client.query(ROSTER_QUERY, job_config=job_config).result().to_arrow(create_bqstorage_client=True)
+
+
+def compact_roster(table):
+    # Integer student ids where possible and dictionary-encoded grades
+    frame = table.to_pandas()
+    numeric_ids = pd.to_numeric(frame['local_student_id'], errors='coerce')
+    if numeric_ids.notna().all():
+        frame['local_student_id'] = numeric_ids.astype('int64')
+    else:
+        frame['local_student_id'] = frame['local_student_id'].astype(str)
+    frame['grade_levels'] = frame['grade_levels'].astype('category')
+    return pa.Table.from_pandas(frame, preserve_index=False)
+
+
+def load_roster(years_data, cache_dir=ROSTER_CACHE_DIR, max_age_hours=ROSTER_CACHE_MAX_AGE_HOURS):
+    """
+    Returns the (local_student_id, grade_levels) roster for years_data, from the local cache when it is
+    younger than max_age_hours, otherwise from BigQuery (refreshing the cache).
+    """
+    path = roster_cache_path(years_data, cache_dir)
+    if os.path.exists(path) and time.time() - os.path.getmtime(path) < max_age_hours * 3600:
+        logging.info(f'Using cached roster for {years_data} from {path}')
+        return pq.read_table(path, memory_map=True).to_pandas()
+
+    table = compact_roster(fetch_roster(years_data))
+    try:
+        os.makedirs(cache_dir, exist_ok=True)
+        tmp_path = f'{path}.tmp'
+        pq.write_table(table, tmp_path, compression='zstd')
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f'Unable to cache roster to {path} due to {e}')
+    logging.info(f'Loaded {table.num_rows} roster rows for {years_data} from BigQuery')
+    return table.to_pandas()
+
+
+def lookup_grade_levels(student_ids, roster):
+    """
+    Looks up grade_levels for each student id through a hash index on the roster ids.
+
+    Returns:
+        pd.Series aligned with student_ids, or None if the roster has students with more than one grade
+        (the caller then falls back to a merge so those rows are duplicated as before).
+    """
+    if not roster['local_student_id'].is_unique:
+        return None
+
+    if pd.api.types.is_integer_dtype(roster['local_student_id']):
+        keys = pd.to_numeric(student_ids, errors='coerce')
+    else:
+        keys = student_ids.astype(str)
+
+    lookup = roster.set_index('local_student_id')['grade_levels']
+    if isinstance(lookup.dtype, pd.CategoricalDtype):
+        lookup = lookup.astype(lookup.cat.categories.dtype)
+    # reindex resolves every key through the index's hash table, missing students come back as NaN like the left merge
+    return pd.Series(lookup.reindex(keys).to_numpy(), index=student_ids.index)
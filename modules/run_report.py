@@ -0,0 +1,225 @@
+import io
+import json
+import logging
+import os
+import re
+import threading
+import time
+from datetime import datetime
+import pandas as pd
+from .profiling import stage_profiler
+
+#RUN_REPORT_PATH (a local directory or gs://bucket/prefix, e.g. gs://illuminatebucket-icefschools-1/run_reports) writes
+#run reports to {RUN_REPORT_PATH}/{years_data}/{run_id}/. Unset, the summary is only logged.
+RUN_REPORT_PATH = os.getenv('RUN_REPORT_PATH')
+RSS_SAMPLE_SECONDS = float(os.getenv('RSS_SAMPLE_SECONDS', 0.25))
+PERCENTILES = [0.5, 0.9, 0.95, 0.99]
+
+REQUEST_COLUMNS = ['url_ext', 'status_code', 'latency_s', 'bytes', 'retries', 'parse_s', 'cached', 'finished_at']
+DECODE_COLUMNS = ['assessment_id', 'endpoint', 'page', 'rows', 'decode_s']
+PATH_PATTERN = re.compile(r'^([^/?]+)')
+ASSESSMENT_PATTERN = re.compile(r'[?&]assessment_id=([^&]+)')
+PAGE_PATTERN = re.compile(r'[?&]page=(\d+)')
+
+
+def current_rss():
+    import psutil
+    return psutil.Process().memory_info().rss
+
+
+class RssSampler:
+    """
+    Samples the process RSS on a background thread, so a stage's peak is seen even if memory is freed before it ends.
+    """
+
+    def __init__(self, interval=RSS_SAMPLE_SECONDS):
+        self.interval = interval
+        self.peak = current_rss()
+        self._stop = threading.Event()
+        self._thread = threading.Thread(target=self._run, name='illuminate-rss-sampler', daemon=True)
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            self.peak = max(self.peak, current_rss())
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._stop.set()
+        self._thread.join()
+        self.peak = max(self.peak, current_rss())
+
+
+class StageTimer:
+    """
+    Wall time and peak RSS of one pipeline stage, recorded on the report when the stage ends.
+    With PIPELINE_PROFILE set the stage is also profiled, see modules/profiling.py.
+    """
+
+    def __init__(self, report, name):
+        self.report = report
+        self.name = name
+        self.start = time.perf_counter()
+        self.rss_before = current_rss()
+        self.sampler = RssSampler().__enter__()
+        # cProfile / sampling / tracemalloc for this stage when PIPELINE_PROFILE is set
+        self.profiler = stage_profiler(name)
+        self.ended = False
+
+    def end(self):
+        if self.ended:
+            return
+        self.ended = True
+        if self.profiler is not None:
+            self.profiler.stop()
+        self.sampler.__exit__(None, None, None)
+        record = {
+            'stage': self.name,
+            'wall_s': round(time.perf_counter() - self.start, 3),
+            'rss_before_mb': round(self.rss_before / 1024 ** 2, 1),
+            'peak_rss_mb': round(self.sampler.peak / 1024 ** 2, 1),
+        }
+        self.report.stages.append(record)
+        logging.info(f"Stage {self.name} took {record['wall_s']}s, peak RSS {record['peak_rss_mb']} MB")
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.end()
+
+
+class RunReport:
+    """
+    Collects per-request and per-stage measurements for one pipeline run.
+
+    Requests are recorded by illuminate_get and fetch_url_ext, page decodes by handle_scores_response and
+    stage timings by the stage context manager. Recording is a list append, cheap enough for the hot path.
+    """
+
+    def __init__(self):
+        self.reset()
+
+    def reset(self):
+        self.requests = []
+        self.decodes = []
+        self.stages = []
+        self.fetch_logs = {}
+        self.started = datetime.now()
+
+    def record_request(self, url_ext, status_code, latency, bytes_received, retries, parse_seconds, cached=False):
+        self.requests.append((url_ext, status_code, latency, bytes_received, retries, parse_seconds, cached, time.time()))
+
+    def record_decode(self, assessment_id, endpoint, page, rows, decode_seconds):
+        self.decodes.append((assessment_id, endpoint, page, rows, decode_seconds))
+
+    def add_fetch_log(self, endpoint, log_frame):
+        # The per-assessment log frames built by get_assessment_scores
+        if log_frame is not None and not log_frame.empty:
+            self.fetch_logs[endpoint] = log_frame
+
+    def stage(self, name):
+        # Use as a context manager, or call .end() on the returned timer
+        return StageTimer(self, name)
+
+    def request_frame(self):
+        frame = pd.DataFrame(self.requests, columns=REQUEST_COLUMNS)
+        urls = frame['url_ext'].astype(str)
+        frame['endpoint_path'] = urls.str.extract(PATH_PATTERN)[0]
+        frame['assessment_id'] = urls.str.extract(ASSESSMENT_PATTERN)[0]
+        frame['page'] = pd.to_numeric(urls.str.extract(PAGE_PATTERN)[0])
+        return frame
+
+    def decode_frame(self):
+        return pd.DataFrame(self.decodes, columns=DECODE_COLUMNS)
+
+    def fetch_log_frame(self):
+        if not self.fetch_logs:
+            return pd.DataFrame()
+        return pd.concat(self.fetch_logs.values(), ignore_index=True)
+
+    def summary(self):
+        requests = self.request_frame()
+        decodes = self.decode_frame()
+        summary = {
+            'started': self.started.isoformat(),
+            'finished': datetime.now().isoformat(),
+            'stages': self.stages,
+            'requests': {
+                'count': int(len(requests)),
+                'cached': int(requests['cached'].sum()),
+                'status_codes': {str(k): int(v) for k, v in requests['status_code'].value_counts().items()},
+                'retries': int(requests['retries'].sum()),
+                'bytes': int(requests['bytes'].sum()),
+            },
+        }
+        if not requests.empty:
+            live = requests[~requests['cached']]
+            summary['requests']['latency_s'] = percentiles(live['latency_s'])
+            summary['requests']['bytes_per_request'] = percentiles(requests['bytes'])
+            summary['requests']['parse_s'] = percentiles(requests['parse_s'])
+            summary['requests']['by_endpoint'] = {
+                path: {'count': int(len(group)), 'latency_s': percentiles(group['latency_s']), 'retries': int(group['retries'].sum())}
+                for path, group in live.groupby('endpoint_path')
+            }
+            slowest = live.groupby('assessment_id').agg(requests=('url_ext', 'size'), latency_s=('latency_s', 'sum'),
+                                                         bytes=('bytes', 'sum'), retries=('retries', 'sum'))
+            summary['slowest_assessments'] = json.loads(slowest.nlargest(20, 'latency_s').reset_index().to_json(orient='records'))
+        if not decodes.empty:
+            summary['decode'] = {'pages': int(len(decodes)), 'rows': int(decodes['rows'].sum()), 'decode_s': percentiles(decodes['decode_s'])}
+        logs = self.fetch_log_frame()
+        if not logs.empty:
+            summary['fetch_log'] = {
+                endpoint: {'assessments': int(len(log)), 'pages': int(pd.to_numeric(log['Num_of_Pages'], errors='coerce').sum()),
+                           'tests': int(pd.to_numeric(log['Num_Of_Tests'], errors='coerce').sum()),
+                           'failed': int((log['Status_Code'] != 200).sum())}
+                for endpoint, log in self.fetch_logs.items()
+            }
+        return summary
+
+    def write(self, years_data, path=RUN_REPORT_PATH):
+        """
+        Logs the summary and, when path is set, writes report.json plus requests, decodes and fetch_log Parquet files.
+        A failure to write is logged and never fails the run.
+        """
+        from .watermarks import join_path, write_bytes
+        summary = self.summary()
+        logging.info(f'Run report: {json.dumps({k: summary[k] for k in ("stages", "requests") if k in summary}, default=str)}')
+        if not path:
+            return None
+
+        root = join_path(path, str(years_data), self.started.strftime('%Y%m%dT%H%M%S'))
+        try:
+            write_bytes(join_path(root, 'report.json'), json.dumps(summary, indent=2, default=str).encode('utf-8'))
+            for name, frame in [('requests', self.request_frame()), ('decodes', self.decode_frame()), ('fetch_log', self.fetch_log_frame())]:
+                if frame.empty:
+                    continue
+                buffer = io.BytesIO()
+                frame.astype({c: str for c in frame.columns if frame[c].dtype == object}).to_parquet(buffer, index=False)
+                write_bytes(join_path(root, f'{name}.parquet'), buffer.getvalue())
+        except Exception as e:
+            logging.warning(f'Unable to write run report to {root} due to {e}')
+            return None
+        logging.info(f'Run report written to {root}')
+        return root
+
+
+def percentiles(values):
+    values = pd.to_numeric(values, errors='coerce').dropna()
+    if values.empty:
+        return {}
+    quantiles = values.quantile(PERCENTILES)
+    result = {f'p{int(q * 100)}': round(float(v), 4) for q, v in quantiles.items()}
+    result['max'] = round(float(values.max()), 4)
+    result['mean'] = round(float(values.mean()), 4)
+    return result
+
+
+#Process-wide report, shared by the fetch paths and the pipeline stages
+run_report = RunReport()
+
+
+def stage(name):
+    return run_report.stage(name)
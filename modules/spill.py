@@ -0,0 +1,139 @@
+import logging
+import os
+import tempfile
+import threading
+import uuid
+import pandas as pd
+import pyarrow as pa
+import pyarrow.parquet as pq
+
+#Frames appended beyond this budget are written to a Parquet spill file instead of held in memory
+SPILL_MEMORY_BUDGET_MB = int(os.getenv('SPILL_MEMORY_BUDGET_MB', 512))
+SPILL_DIR = os.getenv('SPILL_DIR', tempfile.gettempdir())
+
+
+def align_to_schema(table, schema):
+    # Reorders/casts table columns to schema, filling missing columns with nulls. Raises if columns cannot be reconciled.
+    extra = set(table.column_names) - set(schema.names)
+    if extra:
+        raise ValueError(f'Columns {sorted(extra)} are not in the spill schema')
+    columns = []
+    for field in schema:
+        if field.name in table.column_names:
+            column = table.column(field.name)
+            columns.append(column if column.type == field.type else column.cast(field.type))
+        else:
+            columns.append(pa.nulls(table.num_rows, type=field.type))
+    return pa.Table.from_arrays(columns, schema=schema)
+
+
+def without_null_types(schema):
+    # All-null page columns come through as the null type, store them as strings so later pages can be cast in
+    return pa.schema([pa.field(f.name, pa.string()) if pa.types.is_null(f.type) else f for f in schema])
+
+
+class SpilledFrame:
+    """
+    Lazily loaded result of a FrameSpillAccumulator. Nothing is read back from disk until to_pandas() or iter_batches().
+    """
+
+    def __init__(self, path, memory_frames, rows, columns):
+        self.path = path
+        self._memory_frames = memory_frames
+        self.rows = rows
+        self.columns = columns
+
+    def __len__(self):
+        return self.rows
+
+    @property
+    def empty(self):
+        return self.rows == 0
+
+    def iter_batches(self, batch_size=65536):
+        # Yields DataFrames without materializing the whole result
+        if self.path is not None:
+            parquet_file = pq.ParquetFile(self.path, memory_map=True)
+            for batch in parquet_file.iter_batches(batch_size=batch_size):
+                yield batch.to_pandas()
+        for frame in self._memory_frames:
+            yield frame
+
+    def to_pandas(self):
+        frames = []
+        if self.path is not None:
+            frames.append(pq.read_table(self.path, memory_map=True).to_pandas())
+        frames.extend(self._memory_frames)
+        if not frames:
+            return pd.DataFrame()
+        return pd.concat(frames, ignore_index=True) if len(frames) > 1 else frames[0]
+
+    def cleanup(self):
+        if self.path is not None and os.path.exists(self.path):
+            os.remove(self.path)
+
+
+class FrameSpillAccumulator:
+    """
+    Collects page or assessment frames without the repeated pd.concat of a growing result.
+    Frames are buffered until memory_budget_bytes is reached, then flushed as one Arrow record batch
+    to a Parquet spill file. Frames whose columns cannot be reconciled with the spill schema stay in memory.
+    """
+
+    def __init__(self, name='frames', memory_budget_bytes=None, spill_dir=None):
+        self.name = name
+        self.memory_budget_bytes = memory_budget_bytes if memory_budget_bytes is not None else SPILL_MEMORY_BUDGET_MB * 1024 ** 2
+        self.spill_dir = spill_dir or SPILL_DIR
+        self.rows = 0
+        self.spilled_rows = 0
+        self._buffer = []
+        self._buffered_bytes = 0
+        self._unspillable = []
+        self._columns = []
+        self._path = None
+        self._writer = None
+        self._schema = None
+        self._lock = threading.Lock()
+
+    def append(self, frame):
+        if frame is None or frame.empty:
+            return
+        with self._lock:
+            self._buffer.append(frame)
+            self._buffered_bytes += int(frame.memory_usage(deep=True).sum())
+            self.rows += len(frame)
+            for column in frame.columns:
+                if column not in self._columns:
+                    self._columns.append(column)
+            if self._buffered_bytes > self.memory_budget_bytes:
+                self._spill()
+
+    def _spill(self):
+        # Called with the lock held
+        frames, self._buffer, self._buffered_bytes = self._buffer, [], 0
+        combined = pd.concat(frames, ignore_index=True)
+        try:
+            table = pa.Table.from_pandas(combined, preserve_index=False)
+            if self._writer is None:
+                self._schema = without_null_types(table.schema)
+                self._path = os.path.join(self.spill_dir, f'{self.name}-{uuid.uuid4().hex}.parquet')
+                self._writer = pq.ParquetWriter(self._path, self._schema, compression='zstd')
+            self._writer.write_table(align_to_schema(table, self._schema))
+            self.spilled_rows += len(combined)
+            logging.debug(f'Spilled {len(combined)} rows of {self.name} to {self._path}')
+        except (pa.ArrowException, ValueError) as e:
+            logging.warning(f'Unable to spill {len(combined)} rows of {self.name} to disk, keeping them in memory: {e}')
+            self._unspillable.append(combined)
+
+    def result(self):
+        """
+        Closes the spill file and returns a SpilledFrame over everything appended.
+        """
+        with self._lock:
+            memory_frames = self._unspillable + self._buffer
+            self._buffer, self._unspillable = [], []
+            if self._writer is not None:
+                self._writer.close()
+                self._writer = None
+                logging.info(f'{self.name}: {self.spilled_rows} of {self.rows} rows spilled to {self._path}')
+            return SpilledFrame(self._path, memory_frames, self.rows, list(self._columns))
@@ -0,0 +1,89 @@
+import logging
+
+#Columns of illuminate_assessment_results that are derived from the assessment rather than the student response
+DIMENSION_COLUMNS = ['title', 'curriculum', 'unit', 'unit_labels', 'test_type']
+
+#Column order of the wide illuminate_assessment_results output, rebuilt by rebuild_wide and the compatibility view
+WIDE_COLUMNS = ['data_source', 'assessment_id', 'date_taken', 'grade', 'local_student_id', 'test_type', 'curriculum', 'unit',
+                'unit_labels', 'title', 'standard_code', 'score', 'performance_band_level', 'performance_band_label',
+                'proficiency', 'mastered', '__count', 'year']
+
+
+def varying_columns(view, columns):
+    # Derived columns that are not constant within an assessment_id (e.g. the grade-dependent 141506 curriculum)
+    counts = view.groupby('assessment_id', observed=True)[columns].nunique(dropna=False)
+    return [column for column in columns if (counts[column] > 1).any()]
+
+
+def split_dimension_fact(view, assessments_metadata=None):
+    """
+    Splits the wide view into an assessments dimension and a slim fact table keyed by assessment_id and student.
+
+    Derived columns that vary within an assessment stay on the fact table so rebuild_wide reproduces the wide
+    shape exactly. The dimension also carries the assessments_metadata columns not already derived.
+
+    Returns:
+        tuple: (assessments_dim, fact)
+    """
+    view = view.copy()
+    view['assessment_id'] = view['assessment_id'].astype(str)
+    derived = [column for column in DIMENSION_COLUMNS if column in view.columns]
+    fact_derived = varying_columns(view, derived) if derived else []
+    if fact_derived:
+        logging.info(f'Derived columns {fact_derived} vary within an assessment_id and stay on the fact table')
+    dim_columns = [column for column in derived if column not in fact_derived]
+
+    dim = view[['assessment_id'] + dim_columns].drop_duplicates('assessment_id').reset_index(drop=True)
+    if assessments_metadata is not None and not assessments_metadata.empty:
+        metadata = assessments_metadata.copy()
+        metadata['assessment_id'] = metadata['assessment_id'].astype(str)
+        metadata = metadata.drop(columns=[c for c in metadata.columns if c in dim.columns and c != 'assessment_id'])
+        dim = dim.merge(metadata.drop_duplicates('assessment_id'), on='assessment_id', how='left')
+
+    fact = view.drop(columns=dim_columns)
+    logging.info(f'Split view into {len(dim)} assessments and {len(fact)} fact rows ({len(fact.columns)} columns)')
+    return dim, fact
+
+
+def rebuild_wide(dim, fact):
+    # Pandas equivalent of the compatibility view
+    dim_columns = ['assessment_id'] + [c for c in DIMENSION_COLUMNS if c in dim.columns and c not in fact.columns]
+    wide = fact.merge(dim[dim_columns], on='assessment_id', how='left')
+    return wide[[c for c in WIDE_COLUMNS if c in wide.columns]]
+
+
+def compat_view_sql(project_id, dataset_id, dim_table, fact_table, view_name, fact_columns):
+    """
+    CREATE OR REPLACE VIEW statement that joins the dimension back onto the fact table in the wide column order.
+    """
+    select = []
+    for column in WIDE_COLUMNS:
+        source = 'f' if column in fact_columns or column not in DIMENSION_COLUMNS else 'd'
+        select.append(f'{source}.`{column}`')
+    select_sql = ',\n    '.join(select)
+    return f'''
+    CREATE OR REPLACE VIEW `{project_id}.{dataset_id}.{view_name}` AS
+    SELECT
+    {select_sql}
+    FROM `{project_id}.{dataset_id}.{fact_table}` f
+    LEFT JOIN `{project_id}.{dataset_id}.{dim_table}` d
+    USING (assessment_id)
+    '''
+
+
+def publish_compat_view(project_id, dataset_id, dim_table, fact_table, view_name, fact_columns, source_uris, fmt):
+    """
+    Exposes the uploaded dimension and fact files as external tables, then publishes the compatibility view over them.
+
+    Args:
+        source_uris (dict): table name -> gs:// URI of its uploaded file, for dim_table and fact_table.
+        fmt (str): 'csv' or 'parquet', the format the files were written in.
+    """
+    from google.cloud import bigquery
+    from .partitions import create_external_table
+    client = bigquery.Client(project=project_id)
+    for table in (dim_table, fact_table):
+        create_external_table(client, f'{project_id}.{dataset_id}.{table}', fmt, [source_uris[table]])
+    sql = compat_view_sql(project_id, dataset_id, dim_table, fact_table, view_name, fact_columns)
+    logging.info(f'Publishing compatibility view {view_name}')
+    client.query(sql).result()
@@ -0,0 +1,45 @@
+import logging
+import os
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+#Each upload streams its frame in ROWS_PER_CHUNK slices, so memory grows with the number of concurrent uploads, not frame size
+UPLOAD_MAX_CONCURRENT = int(os.getenv('UPLOAD_MAX_CONCURRENT', 4))
+
+
+class UploadError(RuntimeError):
+    """Raised when one or more artifacts fail to upload."""
+
+
+def upload_artifacts(artifacts, upload, max_concurrent=UPLOAD_MAX_CONCURRENT):
+    """
+    Serializes and uploads every artifact concurrently.
+
+    Args:
+        artifacts (list): (name, frame) pairs.
+        upload (callable): upload(frame, name) -> bytes written.
+        max_concurrent (int): Upper bound on uploads in flight.
+
+    Returns:
+        dict: name -> bytes written.
+
+    Raises:
+        UploadError: if any upload failed, after every other upload has finished.
+    """
+    uploaded = {}
+    failures = {}
+
+    with ThreadPoolExecutor(max_workers=max_concurrent, thread_name_prefix='illuminate-upload') as executor:
+        future_to_name = {executor.submit(upload, frame, name): name for name, frame in artifacts}
+        for future in as_completed(future_to_name):
+            name = future_to_name[future]
+            try:
+                uploaded[name] = future.result()
+            except Exception as e:
+                logging.error(f'Failed to upload {name}: {e}')
+                failures[name] = e
+
+    if failures:
+        raise UploadError(f'{len(failures)} of {len(artifacts)} uploads failed: {sorted(failures)}')
+
+    logging.info(f'Uploaded {len(uploaded)} artifacts, {round(sum(uploaded.values()) / 1024 ** 2, 2)} MB in total')
+    return uploaded
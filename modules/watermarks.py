@@ -0,0 +1,191 @@
+import io
+import json
+import logging
+import os
+import shutil
+import pandas as pd
+from datetime import datetime
+from functools import lru_cache
+from .fingerprint import fingerprint, stored_fingerprint, strip_fingerprint, is_fingerprint_column
+
+#Natural keys used to merge incremental rows into the previous output. A merge only uses the key when every column is
+#present in both frames, a partial key could collapse distinct rows (e.g. every group of a student) into one.
+NATURAL_KEYS = {
+    'No_Standard': ['assessment_id', 'local_student_id', 'date_taken', 'version'],
+    'Standard': ['assessment_id', 'local_student_id', 'date_taken', 'academic_benchmark_guid', 'standard_code'],
+    'Group': ['assessment_id', 'local_student_id', 'date_taken', 'group_id', 'group_name', 'reporting_group'],
+}
+
+
+def split_gcs_path(path):
+    # gs://bucket/some/blob -> (bucket, some/blob)
+    bucket_name, _, blob_name = path[len('gs://'):].partition('/')
+    return bucket_name, blob_name
+
+
+@lru_cache(maxsize=1)
+def storage_client():
+    # One client for every state and spool read / write
+    from google.cloud import storage
+    return storage.Client()
+
+
+def read_bytes(path):
+    # Returns None if nothing has been written at path yet
+    if path.startswith('gs://'):
+        bucket_name, blob_name = split_gcs_path(path)
+        blob = storage_client().bucket(bucket_name).blob(blob_name)
+        if not blob.exists():
+            return None
+        return blob.download_as_bytes()
+    if not os.path.exists(path):
+        return None
+    with open(path, 'rb') as f:
+        return f.read()
+
+
+def write_bytes(path, data):
+    if path.startswith('gs://'):
+        bucket_name, blob_name = split_gcs_path(path)
+        storage_client().bucket(bucket_name).blob(blob_name).upload_from_string(data)
+        return
+    os.makedirs(os.path.dirname(path) or '.', exist_ok=True)
+    tmp_path = f'{path}.tmp'
+    with open(tmp_path, 'wb') as f:
+        f.write(data)
+    os.replace(tmp_path, path)
+
+
+def list_names(path):
+    # Names of the files directly under path, empty if nothing has been written there
+    if path.startswith('gs://'):
+        bucket_name, prefix = split_gcs_path(path.rstrip('/') + '/')
+        blobs = storage_client().list_blobs(bucket_name, prefix=prefix, delimiter='/')
+        return [blob.name[len(prefix):] for blob in blobs]
+    if not os.path.isdir(path):
+        return []
+    return [name for name in os.listdir(path) if os.path.isfile(os.path.join(path, name))]
+
+
+def delete_tree(path):
+    # Deletes everything under path, returns the number of files removed
+    if path.startswith('gs://'):
+        bucket_name, prefix = split_gcs_path(path.rstrip('/') + '/')
+        blobs = list(storage_client().list_blobs(bucket_name, prefix=prefix))
+        for blob in blobs:
+            blob.delete()
+        return len(blobs)
+    if not os.path.isdir(path):
+        return 0
+    removed = sum(len(files) for _, _, files in os.walk(path))
+    shutil.rmtree(path)
+    return removed
+
+
+def join_path(root, *parts):
+    return '/'.join([root.rstrip('/')] + list(parts))
+
+
+def merge_incremental(previous, new, natural_key):
+    """
+    Merges newly fetched rows into the previous output. Rows sharing a natural key are replaced by the new version.
+
+    Rows are matched on a fingerprint of the natural key. The previous output carries its fingerprint from the
+    last save, so only the new rows are hashed; the merged frame keeps the fingerprint columns.
+    """
+    if previous is None or previous.empty:
+        return new
+    if new is None or new.empty:
+        return previous
+
+    missing = [col for col in natural_key if col not in previous.columns or col not in new.columns]
+    key = natural_key
+    if missing:
+        # Without the full key rows are only replaced when identical, across the columns of both frames
+        logging.warning(f'Natural key columns {missing} missing, falling back to full row deduplication')
+        key = [col for col in previous.columns if not is_fingerprint_column(col)]
+        key += [col for col in new.columns if col not in key and not is_fingerprint_column(col)]
+
+    previous_prints = stored_fingerprint(previous) if key == natural_key else None
+    if previous_prints is None:
+        previous_prints = fingerprint(previous, key, normalize=True)
+    new_prints = fingerprint(new, key, normalize=True)
+
+    combined = pd.concat([strip_fingerprint(previous), strip_fingerprint(new)], ignore_index=True)
+    prints = pd.concat([previous_prints, new_prints], ignore_index=True)
+    keep_rows = ~prints.duplicated(keep='last').to_numpy()
+    if key != natural_key:
+        # Only fingerprints of the full natural key are kept for reuse
+        return combined[keep_rows].reset_index(drop=True)
+    combined[list(prints.columns)] = prints
+    return combined[keep_rows].reset_index(drop=True)
+
+
+class IncrementalState:
+    """
+    Per (assessment_id, endpoint) high-water marks of date_taken, plus the previous output of each endpoint.
+    state_path can be a local directory or a gs://bucket/prefix, and is scoped by years_data.
+    With reset=True the stored state is ignored, so the run fetches everything and overwrites it.
+
+    Layout:
+        {state_path}/{years_data}/watermarks.json
+        {state_path}/{years_data}/{endpoint}.parquet
+    """
+
+    def __init__(self, state_path, years_data, reset=False):
+        self.root = join_path(state_path, str(years_data))
+        self.reset = reset
+        self.watermarks = {}
+        if reset:
+            logging.info(f'Resetting incremental state at {self.root}')
+            return
+        raw = read_bytes(join_path(self.root, 'watermarks.json'))
+        if raw:
+            self.watermarks = json.loads(raw).get('watermarks', {})
+        logging.info(f'Loaded {sum(len(v) for v in self.watermarks.values())} watermarks from {self.root}')
+
+    def start_dates(self, assessment_id_list, endpoint_list, start_date):
+        """
+        Returns {(assessment_id, endpoint): date_taken_start}. Assessments with no watermark start at start_date.
+        The watermark day itself is refetched and reconciled through the natural key merge.
+        """
+        overrides = {}
+        for endpoint in endpoint_list:
+            endpoint_marks = self.watermarks.get(endpoint, {})
+            for _id in assessment_id_list:
+                mark = endpoint_marks.get(str(_id))
+                if mark and mark > str(start_date):
+                    overrides[(_id, endpoint)] = mark
+        logging.info(f'{len(overrides)} work items will be fetched incrementally from their watermark')
+        return overrides
+
+    def load_previous(self, endpoint):
+        if self.reset:
+            return None
+        raw = read_bytes(join_path(self.root, f'{endpoint}.parquet'))
+        if raw is None:
+            return None
+        return pd.read_parquet(io.BytesIO(raw))
+
+    def merge(self, endpoint, new_frame):
+        # Merge newly fetched rows into the stored output for endpoint, and advance its watermarks
+        merged = merge_incremental(self.load_previous(endpoint), new_frame, NATURAL_KEYS[endpoint])
+        if new_frame is not None and not new_frame.empty and 'date_taken' in new_frame.columns:
+            latest = pd.to_datetime(new_frame['date_taken']).groupby(new_frame['assessment_id'].astype(str)).max()
+            endpoint_marks = self.watermarks.setdefault(endpoint, {})
+            for _id, date_taken in latest.items():
+                mark = date_taken.strftime('%Y-%m-%d')
+                if mark > endpoint_marks.get(_id, ''):
+                    endpoint_marks[_id] = mark
+        self._save_frame(endpoint, merged)
+        return strip_fingerprint(merged)
+
+    def _save_frame(self, endpoint, frame):
+        buffer = io.BytesIO()
+        frame.to_parquet(buffer, index=False)
+        write_bytes(join_path(self.root, f'{endpoint}.parquet'), buffer.getvalue())
+
+    def save(self):
+        payload = {'updated': datetime.now().isoformat(), 'watermarks': self.watermarks}
+        write_bytes(join_path(self.root, 'watermarks.json'), json.dumps(payload, indent=2).encode('utf-8'))
+        logging.info(f'Saved watermarks to {self.root}')
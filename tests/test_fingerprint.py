@@ -0,0 +1,49 @@
+"""
+Checks that normalized row fingerprints do not depend on how a frame's columns happen to be typed.
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+import numpy as np
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.fingerprint import fingerprint, stored_fingerprint, strip_fingerprint  # noqa: E402
+
+
+def rows_as(dtype_by_column):
+    # The same three rows, one of them with every value missing, in the given dtypes
+    frame = pd.DataFrame({
+        'local_student_id': ['500001', '500002', None],
+        'score': [80.0, 65.5, np.nan],
+        'standard_code': ['6.RP.A.3', 'percent', None],
+    })
+    return frame.astype(dtype_by_column)
+
+
+def test_equal_rows_fingerprint_alike_across_dtypes():
+    expected = fingerprint(rows_as({'local_student_id': object, 'score': 'float64', 'standard_code': object}), normalize=True)
+    for dtypes in [
+        {'local_student_id': 'str', 'score': 'Float64', 'standard_code': 'str'},
+        {'local_student_id': 'string', 'score': 'float64', 'standard_code': 'category'},
+        {'local_student_id': 'category', 'score': 'float32', 'standard_code': 'string'},
+    ]:
+        actual = fingerprint(rows_as(dtypes), normalize=True)
+        assert actual.equals(expected), dtypes
+
+
+def test_missing_column_fingerprints_as_missing_values():
+    frame = rows_as({'local_student_id': 'str', 'score': 'float64', 'standard_code': 'str'})
+    frame['version'] = np.nan
+    with_column = fingerprint(frame, ['local_student_id', 'version'], normalize=True)
+    without_column = fingerprint(frame.drop(columns='version'), ['local_student_id', 'version'], normalize=True)
+    assert with_column.equals(without_column)
+
+
+def test_fingerprints_stored_before_the_version_bump_are_not_reused():
+    frame = rows_as({'local_student_id': 'str', 'score': 'float64', 'standard_code': 'str'})
+    frame['__fingerprint'] = np.arange(len(frame), dtype='uint64')
+    assert stored_fingerprint(frame) is None
+    assert list(strip_fingerprint(frame).columns) == ['local_student_id', 'score', 'standard_code']
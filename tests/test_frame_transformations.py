@@ -0,0 +1,292 @@
+"""
+Checks for the frame transformations that must not change their output:
+the dtype policy shrinks bytes per row, and unit / curriculum extraction on distinct titles matches the
+row-wise logic it replaced.
+
+    python -m pytest -q -s tests  # -s shows the bytes per row report
+"""
+import os
+import re
+import sys
+import numpy as np
+import pandas as pd
+import pytest
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.dtypes import apply_dtype_policy, bytes_per_row  # noqa: E402
+import modules.frame_transformations as frame_transformations  # noqa: E402
+from modules.frame_transformations import add_in_unit_col, add_in_curriculum_col  # noqa: E402
+from modules.overrides import load_override_rules, apply_overrides  # noqa: E402
+
+#Titles in the shapes the unit and curriculum rules look for, plus ones that match nothing
+TITLES = [
+    'Grade 6 Math 6.RP.A.3.b Checkpoint',
+    'Grade 7 Math 7.EE.B.4 Checkpoint',
+    'PLTW Algebra Advantage Checkpoint Lesson 1',
+    'IM Grade 6 Unit 2 End-of-Unit Assessment',
+    'IM Grade 8 Unit 3 Mid-Unit Assessment',
+    '8th Grade Science Interim Assessment #1',
+    'Grade 8 Interim Assessment #2',
+    '9th Grade Science Interim Assessment 1',
+    'Grade 10 Science Unit 3 Assessment',
+    '12th Grade Anatomy Final',
+    'Grade 9 Math Unit 1 Assessment 25-26',
+    '10th Grade Math Unit 2 Assessment',
+    'Grade 11 Math Interim 2',
+    'Algebra I Unit 1 Assessment 25-26',
+    'Algebra 1 IA #1 (Sequences + IM)',
+    'Algebra II Interim_PT_2',
+    'Geometry Interim 3B',
+    'Geometry Interim',
+    'PreCal Unit 4 Test',
+    'Pre Cal Final',
+    'Biology Final',
+    'Chemistry Unit 2 Assessment',
+    'Physics Module 2 Quiz',
+    'APUSH Unit 3 Test',
+    'US History IA 2',
+    'MWH Interim Assessment 1',
+    'APWH Module 1',
+    'Gov Unit 1 Assessment',
+    'APGOV Final',
+    'Into Reading Grade 3 Module 2 Assessment',
+    'ELA_G7_Module 1_Lesson 3_Exit Ticket_MC',
+    'ELA_G6_Module 2_Lesson 5_Exit Ticket_CR',
+    'English 10 IA 1',
+    'APLang Unit 1',
+    'APLIT Final',
+    'The Outsiders - Mid-Unit Novel Test',
+    'LOTF Mid-Novel Test',
+    'Math Lab Unit 2 Assessment',
+    'Quantitative Reasoning Unit 1',
+    'Grade 5 Social Studies Unit 3 Assessment',
+    'Spanish I Unit 1 Quiz',
+    'Span1 Final',
+    'Stats Final',
+    'Statistics Interim Assessment #2',
+    'HIST 101 Midterm',
+    'Environmental Science Interim Assessment #1',
+    'Reading Log',
+    'Lesson 4 Check',
+    '',
+]
+ASSESSMENT_IDS = [str(200000 + i) for i in range(len(TITLES))]
+
+#Assessments with a per-assessment curriculum fix, with titles in the shape the fix notes describe
+OVERRIDE_TITLES = [
+    ('115533', 'Grade 8 Interim Assessment #1'),
+    ('141493', 'Interim Assessment #1 | Grade 11 | U.S. History'),
+    ('141492', 'Interim Assessment #1 | Grade 10 | History'),
+    ('141508', 'Environmental Science Interim Assessment #1'),
+    ('141441', 'Algebra 1 IA #1 (Sequences + IM)'),
+    ('141506', 'Grade 9-12 Science Interim Assessment #1'),
+    ('142819', 'Grade 8 Novel Study Assessment'),
+    ('161423', 'Math Lab Unit 2 Assessment'),
+    ('142801', 'Grade 9 Math Support Unit 1'),
+    ('161334', 'Grade 10 History Unit 1 Assessment'),
+    ('161466', 'Span Unit 1 Quiz'),
+    ('161454', 'APLang Unit 1'),
+    ('161418', 'Grade 12 Unit Skills Assessment'),
+    ('68b22e718bbeb32951baaddf', '10th Grade Science Unit 1 Assessment'),
+    ('142815', 'Grade 9 Science Unit 2 Assessment'),
+    ('6917b5dd477a07bb7337dfe8', 'Grade 10 Math Unit 3 Assessment'),
+    ('690bc60f9f7d11ef8ccd4ace', 'Grade 11 Math Unit 3 Assessment'),
+]
+
+
+def baseline_unit_columns(df):
+    # The row-wise add_in_unit_col the distinct-title unit_table replaced, without its per-assessment override
+    df['unit'] = df['title'].str.extract(r'(Interim(?: Assessment)?(?: #?\d+| \d+[A-Z]*|[_ ](?:PT_)?\d+)?|Unit \d+|Final|Module \d+)', expand=False)
+    df.loc[df['title'].str.contains(rf'\b{re.escape("IA")}\b', case=False), 'unit'] = 'Interim 1'
+    df['unit'] = df['unit'].str.replace(r'Assessment|#', '', regex=True).str.strip()
+    df['unit'] = df['unit'].str.replace(r'\s+', ' ', regex=True)
+    df['unit'] = df['unit'].apply(lambda x: re.sub(r'Interim[\s_]+(?:PT_)?(\d+)', r'Interim \1', str(x).strip()))
+    df['unit'] = df['unit'].replace('Interim', 'Interim 1')
+    df['unit'] = df['unit'].replace('Final', 'Final 1')
+    df.loc[df['title'].str.contains('The Outsiders - Mid-Unit Novel Test') | df['title'].str.contains('LOTF Mid-Novel Test'), 'unit'] = 'Mid-Unit 1'
+
+    missing_unit_mask = df['unit'].isna() | (df['unit'] == '')
+    df.loc[missing_unit_mask, 'unit'] = df.loc[missing_unit_mask, 'title'].str.extract(r'(Lesson\s+\d+)', expand=False)
+    missing_unit_mask = df['unit'].isna() | (df['unit'] == '')
+    df.loc[missing_unit_mask, 'unit'] = df.loc[missing_unit_mask, 'title'].str.extract(r'Math\s+([0-9A-Za-z\.\-]+)\s+Checkpoint', expand=False)
+
+    unit_col_sorting = {'Module 1': '1', 'Mid-Unit 1': '1', 'Module 2': '2', 'Module 3': '3', 'Interim 1': '4',
+                        'Interim 2': '5', 'Final 1': '6', 'Unit 1': '1', 'Unit 2': '2', 'Unit 3': '3'}
+    df['unit_labels'] = df['unit'].map(unit_col_sorting)
+    return df
+
+
+def baseline_curriculum_column(df):
+    # The row-wise add_in_curriculum_col the distinct-pair classification and the override registry replaced
+    df['assessment_id'] = df['assessment_id'].astype(str)
+    curriculum_dict = {
+        'Geometry': 'Geometry', 'English': 'English', 'Algebra I': 'Algebra I', 'Algebra II': 'Algebra II',
+        'Algebra 1': 'Algebra I', 'Algebra 11': 'Algebra II', 'PreCal': 'Pre-Calculus', 'Pre Cal': 'Pre-Calculus',
+        'Statistics': 'Statistics', 'Stats': 'Statistics', 'Biology': 'Biology', 'Physics': 'Physics',
+        'Government': 'Government', 'Math Lab': 'Math Lab', 'Anatomy': 'Anatomy', 'Spanish I': 'Spanish I',
+        'Span1': 'Spanish I', 'USH': 'US History', 'US History': 'US History', 'APUSH': 'US History',
+        'World History': 'World History', 'MWH': 'World History', 'APLang': 'ELA', 'Gov': 'Government',
+        'Chemistry': 'Chemistry', 'IM': 'Math', 'Checkpoint': 'Math', 'Science': 'Science', 'Into Reading': 'ELA',
+        'ELA': 'ELA', 'APLIT': 'ELA', 'Math': 'Math', 'Quantitative': 'Math', 'Social Studies': 'History',
+        'History': 'History', 'APWH': 'World History', 'APGOV': 'Government', 'HIST': 'History',
+    }
+    df['curriculum'] = ''
+    for keyword, label in curriculum_dict.items():
+        if keyword in ['IM', 'Checkpoint', 'Math']:
+            if keyword == 'Math':
+                mask = df['title'].str.contains(rf'\b{re.escape(keyword)}\b', case=False) & ~df['title'].str.contains('Math Lab', case=False)
+                df.loc[mask, 'curriculum'] = label
+            else:
+                df.loc[df['title'].str.contains(rf'\b{re.escape(keyword)}\b', case=False), 'curriculum'] = label
+        else:
+            df.loc[df['title'].str.contains(keyword, case=False), 'curriculum'] = label
+
+    df.loc[df['assessment_id'] == '115533', 'curriculum'] = 'Science'
+    df.loc[df['assessment_id'] == '141493', 'curriculum'] = 'US History'
+    df.loc[df['assessment_id'] == '141492', 'curriculum'] = 'World History'
+    df.loc[df['assessment_id'] == '141508', 'curriculum'] = 'Environmental Science'
+    df.loc[df['assessment_id'] == '141441', 'curriculum'] = 'Algebra I'
+    df.loc[(df['assessment_id'] == '141506') & (df['grade_levels'] == 9), 'curriculum'] = 'Biology'
+    df.loc[(df['assessment_id'] == '141506') & (df['grade_levels'] != 9), 'curriculum'] = 'Anatomy'
+    df.loc[df['assessment_id'].isin(['142819', '143028', '161329']), 'curriculum'] = 'ELA'
+    df.loc[df['assessment_id'].isin(['161423', '161431', '161430', '142801', '161390', '161417']), 'curriculum'] = 'Math Lab'
+    df.loc[df['assessment_id'] == '161334', 'curriculum'] = 'World History'
+    df.loc[df['assessment_id'] == '161451', 'curriculum'] = 'US History'
+    df.loc[df['assessment_id'] == '161466', 'curriculum'] = 'Spanish I'
+    df.loc[df['assessment_id'] == '161478', 'curriculum'] = 'Anatomy'
+    df.loc[df['assessment_id'] == '161454', 'curriculum'] = 'ELA'
+    df.loc[df['assessment_id'] == '161452', 'curriculum'] = 'Government'
+    df.loc[df['assessment_id'] == '161450', 'curriculum'] = 'World History'
+    df.loc[df['assessment_id'] == '161418', 'curriculum'] = 'ELA'
+    df.loc[df['assessment_id'] == '161456', 'curriculum'] = 'US History'
+    df.loc[df['assessment_id'] == '68b22e718bbeb32951baaddf', 'curriculum'] = 'Chemistry'
+    df.loc[df['assessment_id'] == '161441', 'curriculum'] = 'Chemistry'
+    df.loc[df['assessment_id'] == '142815', 'curriculum'] = 'Biology'
+    df.loc[df['assessment_id'] == '161471', 'curriculum'] = 'Biology'
+    df.loc[df['assessment_id'] == '161556', 'curriculum'] = 'Biology'
+    df.loc[df['assessment_id'] == '6917b5dd477a07bb7337dfe8', 'curriculum'] = 'Geometry'
+    df.loc[df['assessment_id'] == '690bc60f9f7d11ef8ccd4ace', 'curriculum'] = 'Algebra II'
+
+    def title_has(*words):
+        mask = pd.Series(False, index=df.index)
+        for word in words:
+            mask |= df['title'].str.contains(word, case=False, na=False)
+        return mask
+
+    science = title_has('Science')
+    df.loc[science & title_has('Grade 9', '9th Grade') & df['curriculum'].isin(['', 'Science']), 'curriculum'] = 'Biology'
+    df.loc[science & title_has('Grade 10', '10th Grade') & df['curriculum'].isin(['', 'Science']), 'curriculum'] = 'Chemistry'
+    df.loc[title_has('Science', 'Anatomy') & title_has('Grade 12', '12th Grade') & df['curriculum'].isin(['', 'Science']), 'curriculum'] = 'Anatomy'
+    math = title_has('Math')
+    df.loc[math & title_has('Grade 9', '9th Grade') & df['curriculum'].isin(['', 'Math']), 'curriculum'] = 'Algebra I'
+    df.loc[math & title_has('Grade 10', '10th Grade') & df['curriculum'].isin(['', 'Math']), 'curriculum'] = 'Geometry'
+    df.loc[math & title_has('Grade 11', '11th Grade') & df['curriculum'].isin(['', 'Math']), 'curriculum'] = 'Algebra II'
+    return df
+
+
+def title_rows(repeat=20, seed=0):
+    # Every title repeated and shuffled, as the titles of a fetched result come in
+    rng = np.random.default_rng(seed)
+    index = rng.permutation(np.repeat(np.arange(len(TITLES)), repeat))
+    return pd.DataFrame({
+        'assessment_id': np.array(ASSESSMENT_IDS, dtype=object)[index],
+        'title': np.array(TITLES, dtype=object)[index],
+    })
+
+
+def curriculum_rows(repeat=20, seed=0):
+    # The title rows plus the overridden assessments, with numeric grades so the grade 9 split has both sides
+    rng = np.random.default_rng(seed)
+    ids, titles = zip(*OVERRIDE_TITLES)
+    index = rng.permutation(np.repeat(np.arange(len(ids)), repeat))
+    rows = pd.concat([title_rows(repeat, seed), pd.DataFrame({
+        'assessment_id': np.array(ids, dtype=object)[index],
+        'title': np.array(titles, dtype=object)[index],
+    })], ignore_index=True)
+    rows['grade_levels'] = rng.integers(6, 13, size=len(rows))
+    return rows
+
+
+def as_values(series):
+    # Compare as plain Python values with every missing value as None
+    return [None if pd.isna(value) else value for value in series.astype(object)]
+
+
+def representative_results(rows=20000, seed=0):
+    # Shaped like a combined Standard / No_Standard result before the dtype policy
+    rng = np.random.default_rng(seed)
+    titles = np.array(TITLES[:-1], dtype=object)
+    bands = np.array(['Far Below Basic', 'Below Basic', 'Basic', 'Proficient', 'Advanced'], dtype=object)
+    band = rng.integers(0, len(bands), size=rows)
+    assessment = rng.integers(0, len(titles), size=rows)
+    codes = np.array(['6.RP.A.3', '7.EE.B.4', 'RL.8.1', 'HSA-REI.B.3', 'percent'], dtype=object)
+    return pd.DataFrame({
+        'assessment_id': np.array(ASSESSMENT_IDS, dtype=object)[assessment],
+        'title': titles[assessment],
+        'local_student_id': (500000 + rng.integers(0, 3000, size=rows)).astype(str).astype(object),
+        'date_taken': pd.Timestamp('2025-08-01') + pd.to_timedelta(rng.integers(0, 300, size=rows), unit='D'),
+        'percent_correct': rng.integers(0, 101, size=rows),
+        'performance_band_level': (band + 1).astype(str).astype(object),
+        'performance_band_label': bands[band],
+        'mastered': (rng.random(rows) > 0.5).astype(object),
+        '__count': np.ones(rows, dtype='int64'),
+        'standard_code': codes[rng.integers(0, len(codes), size=rows)],
+        'standard_no_standard': np.where(rng.random(rows) > 0.4, 'Standard', 'No_Standard').astype(object),
+    })
+
+
+def test_dtype_policy_reduces_bytes_per_row():
+    frame = representative_results()
+    before = bytes_per_row(frame)
+    after = bytes_per_row(apply_dtype_policy(frame, name='representative results'))
+    print(f'\nbytes per row: {round(before, 1)} before the dtype policy, {round(after, 1)} after')
+    assert after < before
+
+
+def test_dtype_policy_keeps_values():
+    frame = representative_results(rows=2000)
+    expected = frame.copy()
+    apply_dtype_policy(frame)
+    for column in expected.columns:
+        assert as_values(frame[column]) == as_values(expected[column]), column
+
+
+def test_unit_table_matches_row_wise_extraction():
+    rows = title_rows()
+    expected = baseline_unit_columns(rows.copy())
+    actual = add_in_unit_col(rows.copy())
+    assert as_values(actual['unit']) == as_values(expected['unit'])
+    assert as_values(actual['unit_labels']) == as_values(expected['unit_labels'])
+
+
+def test_distinct_curriculum_matches_row_wise_classification():
+    rows = curriculum_rows()
+    expected = baseline_curriculum_column(rows.copy())
+    actual = apply_overrides(add_in_curriculum_col(rows.copy()), load_override_rules())
+    assert as_values(actual['curriculum']) == as_values(expected['curriculum'])
+
+
+def compact_roster_frame(students, grades):
+    # In the roster cache's shape: integer ids and category grades
+    return pd.DataFrame({
+        'local_student_id': np.array(students, dtype='int64'),
+        'grade_levels': pd.Series(grades, dtype='category'),
+    })
+
+
+@pytest.mark.parametrize('roster', [
+    compact_roster_frame([500001, 500002], ['K', '6']),
+    compact_roster_frame([500001, 500002, 500002], ['K', '6', '7']),
+], ids=['one_grade_per_student', 'student_with_two_grades'])
+def test_view_sets_kindergarten_grade_to_zero(roster, monkeypatch):
+    monkeypatch.setattr(frame_transformations, 'load_roster', lambda years_data: roster.copy())
+    results = representative_results(rows=200)
+    results['local_student_id'] = np.where(np.arange(len(results)) % 2 == 0, '500001', '500002').astype(object)
+    apply_dtype_policy(results)
+
+    view = frame_transformations.create_test_results_view(results, years_data='25-26')
+    grades = view.groupby('local_student_id', observed=True)['grade'].agg(lambda grade: sorted(set(map(str, grade))))
+    expected = sorted(set(map(str, roster.loc[roster['local_student_id'] == 500002, 'grade_levels'])))
+    assert grades['500001'] == ['0']
+    assert grades['500002'] == expected
@@ -0,0 +1,38 @@
+"""
+Checks that the prior-year sidecar keeps the rows the CSV read in append_prior_year kept.
+
+    python -m pytest -q tests
+"""
+import os
+import sys
+import pandas as pd
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from modules.history_cache import load_history, parse_history  # noqa: E402
+
+
+def write_history(path):
+    # Two rows that differ only in how date_taken is written, and one exact duplicate
+    pd.DataFrame({
+        'assessment_id': ['141493', '141493', '141493', '141493'],
+        'local_student_id': ['500001', '500001', '500002', '500002'],
+        'date_taken': ['2024-09-12', '2024-9-12', '2024-09-13', '2024-09-13'],
+        'score': [80, 80, 65, 65],
+    }).to_csv(path, index=False, encoding='ISO-8859-1')
+
+
+def test_parse_history_deduplicates_before_typing_dates(tmp_path):
+    path = tmp_path / 'illuminate_assessment_results_historical.csv'
+    write_history(path)
+    frame = parse_history(str(path))
+    assert len(frame) == 3
+    assert frame['date_taken'].tolist() == [pd.Timestamp('2024-09-12').date()] * 2 + [pd.Timestamp('2024-09-13').date()]
+
+
+def test_sidecar_matches_direct_parse(tmp_path):
+    path = tmp_path / 'illuminate_assessment_results_historical.csv'
+    write_history(path)
+    frame, prints = load_history(str(path), cache_dir=str(tmp_path / 'cache'))
+    assert len(frame) == len(prints) == 3
+    assert frame['date_taken'].tolist() == parse_history(str(path))['date_taken'].tolist()